@@ -0,0 +1,118 @@
+#!/usr/bin/python
+"""
+Rolling origin backtesting of learners.
+Instead of a single split per customer, learners are evaluated at many origins
+(cutoff timestamps), for many periods after every origin. At every origin:
+- the learner learns from the actions before the origin only: a split (see
+  splitViews) at trainWindow before the origin, whose test actions end at the origin.
+- customers with 5 or more actions before the origin (and some after it) are
+  predicted, with the actions before the origin as their history, for every period.
+  Like in splitFn, periods are measured from the last action of the history.
+- predictions are compared, with the errors of testMethod.getError, to the number of
+  actions in [origin, origin+period), which the timestamp index counts with two
+  binary searches per customer.
+Can be called from the command line.
+"""
+
+import argparse
+import random
+import numpy as np
+import dataProcessing
+import errorFns
+from splitViews import SplitView, searchRows, timestampsAt
+from testMethod import getLearner, predictError
+
+# Sorted timestamps of every customer, with prefix counts: in a sorted action store,
+# the number of actions of a customer before a row is the row minus the customer's
+# first row. Counting the actions in a time window is then two binary searches.
+class TimestampIndex():
+    # Arguments
+    #   store: ActionStore with the actions of every customer sorted (see
+    #     dataProcessing.getSortedStore).
+    def __init__(self, store):
+        self.store = store
+        self.customers = np.asarray(store.customers)
+        self.offsets = np.asarray(store.offsets)
+
+    # Positions of customers in the index
+    def positions(self, customerIDs):
+        return np.searchsorted(self.customers, np.asarray(customerIDs, dtype=np.int64))
+
+    # Number of actions of the customers at positions before times
+    def countBefore(self, positions, times):
+        start = self.offsets[positions]
+        return searchRows(self.store, start, self.offsets[positions+1], times)-start
+
+    # Number of actions of the customers at positions in [start, end)
+    def countBetween(self, positions, start, end):
+        return self.countBefore(positions, end)-self.countBefore(positions, start)
+
+# Arguments
+#   store: sorted action store (see dataProcessing.getSortedStore).
+#   Learner: learner factory (see learners).
+#   cutoffs: origins, as timestamps.
+#   periods: periods to predict after every origin, in seconds.
+#   nLearning, nTesting: number of customers learned from, and predicted, at every
+#     origin (fewer if there are not as many).
+#   trainWindow: learners learn from splits at trainWindow seconds before the origin.
+#     None uses the longest period.
+#   rng: random number generator used to pick customers.
+# Output
+#   list of results, one per origin and period, with the average errors of
+#   predictError. Predictions of periods without actions are left out of the errors
+#   (the errors divide by the actual number of actions) and counted in "empty".
+#   "actions" is the total actual number of actions in the periods.
+def backtest(store, Learner, cutoffs, periods, nLearning=1000, nTesting=1000, trainWindow=None, rng=random):
+    if trainWindow is None:
+        trainWindow = max(periods)
+    index = TimestampIndex(store)
+    results = []
+    for cutoff in cutoffs:
+        trainSplit = SplitView(store, cutoff=cutoff-trainWindow, end=cutoff)
+        history = SplitView(store, cutoff=cutoff)
+        if len(trainSplit.customers) == 0 or len(history.customers) == 0:
+            print("No customers to learn from, or to predict, at", cutoff)
+            continue
+        learner = getLearner(trainSplit.train, trainSplit.test, min(nLearning, len(trainSplit.customers)), Learner, rng)
+
+        sample = np.array(sorted(rng.sample(range(len(history.customers)), min(nTesting, len(history.customers)))))
+        customerIDs = history.customers[sample]
+        users = [(c, history.train[c]) for c in customerIDs.tolist()]
+        lastActions = timestampsAt(store, history.ends[sample]-1)
+        positions = index.positions(customerIDs)
+        for period in periods:
+            actual = index.countBetween(positions, cutoff, cutoff+period)
+            predictions = np.asarray(learner.predictBatch(users, cutoff+period-lastActions), dtype=float)
+            counted = actual > 0
+            result = {
+                "learner": learner.name,
+                "cutoff": cutoff,
+                "period": period,
+                "predictions": int(counted.sum()),
+                "empty": int((~counted).sum()),
+                "actions": int(actual.sum()),
+            }
+            for errorFn in predictError:
+                errors = errorFns.vectorized[errorFn](predictions[counted], actual[counted].astype(float))
+                result[errorFn.__name__] = float(errors.mean()) if counted.any() else None
+            results.append(result)
+            print("\t".join(str(v) for v in result.values()))
+    return results
+
+# Called from the command line
+if __name__ == "__main__":
+    import learners
+    parser = argparse.ArgumentParser(description="Backtest a learner at many origins and periods")
+    parser.add_argument("--learner", default="simple", choices=learners.names(), help="learner to run")
+    parser.add_argument("--cutoffs", nargs="+", default=["2004-07-01", "2005-01-01", "2005-07-01"],
+                        help="origins, as YYYY-MM-DD dates")
+    parser.add_argument("--periods", nargs="+", type=float, default=[7, 30, 90], help="periods, in days")
+    parser.add_argument("--learning", type=int, default=1000, help="customers learned from per origin")
+    parser.add_argument("--testing", type=int, default=1000, help="customers predicted per origin")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    args = parser.parse_args()
+
+    cutoffs = [dataProcessing.getTimeStamp(*(int(i) for i in c.split("-"))) for c in args.cutoffs]
+    periods = [p*24*60*60 for p in args.periods]
+    backtest(dataProcessing.getSortedStore(), learners.getFactory(args.learner), cutoffs, periods,
+             args.learning, args.testing, rng=random.Random(args.seed))
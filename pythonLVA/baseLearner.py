@@ -6,11 +6,20 @@ Helps to extract features from data.
 
 from itertools import islice
 import numpy as np
+import persistence
 
 def Learner():
     return lambda: BaseLearner()
 
-class BaseLearner():
+class BaseLearner(persistence.Persistent):
+    # Cached features of the train split (see featureCache.useFeatureCache)
+    featureCache = None
+    # Running state of customers (see onlineState.useOnlineState)
+    onlineState = None
+    # Smallest number of actions of a user that can be predicted: features and HMMs
+    # use the intervals between actions
+    minActions = 2
+
     def __init__(self):
         self.name = "Learner"
 
@@ -55,8 +64,114 @@ class BaseLearner():
         features = np.append(features, otherFeatures)
         return features
 
+    # Same as calling getFeatures on every user, but computed for all of them at once.
+    # Arguments
+    #   userActions: list of user actions, each a list of (timeStamp,rating,movieYear)
+    # Output
+    #   numpy array with the features of every user as its rows.
+    def getFeaturesBatch(self, userActions):
+        offsets = np.cumsum([0]+[len(u) for u in userActions])
+        values = np.array([a for u in userActions for a in u], dtype=float).reshape(-1,3)
+        return segmentFeatures(offsets, values)
+
+    # Same as getFeaturesBatch, but uses the online state, and then the feature cache,
+    # for users that are in them (with the same actions).
+    # Arguments
+    #   customerIDs: list of customerIDs.
+    #   userActions: their actions, each a list of (timeStamp,rating,movieYear)
+    def getFeatureMatrix(self, customerIDs, userActions):
+        sources = [s for s in [self.onlineState, self.featureCache] if s is not None]
+        if not sources:
+            return self.getFeaturesBatch(userActions)
+        features = None
+        missing = np.arange(len(customerIDs))
+        for source in sources:
+            rows,found = source.lookup([customerIDs[i] for i in missing], [userActions[i] for i in missing])
+            if features is None:
+                features = np.zeros((len(customerIDs), rows.shape[1]))
+            features[missing[found]] = rows[found]
+            missing = missing[~found]
+            if len(missing) == 0:
+                break
+        if len(missing) > 0:
+            features[missing] = self.getFeaturesBatch([userActions[i] for i in missing])
+        return features
+
     def learn(self, data):
         pass
         
     def predict(self, user, period):
         pass
+
+    # Batch version of predict. Learners that can predict many users at once more
+    # efficiently override this.
+    # Arguments
+    #   users: list of users, each (customerID, [(timeStamp,rating,movieYear)])
+    #   periods: list of periods, one per user
+    # Output
+    #   numpy array with the prediction for every user.
+    def predictBatch(self, users, periods):
+        return np.array([self.predict(u,p) for u,p in zip(users, periods)], dtype=float)
+
+# Batched feature extraction, on actions in CSR layout: the actions of user i are the
+# rows offsets[i]:offsets[i+1] of values, whose columns are (timeStamp,rating,movieYear).
+# Every user must have at least 2 actions.
+# The results are bit for bit the same as BaseLearner.getFeatures. This is why
+# averages are accumulated in the same order as BaseLearner.average, instead of with
+# np.mean (which sums in a different order).
+
+# Same as BaseLearner.average on every segment of values.
+def segmentAverage(offsets, values):
+    lengths = np.diff(offsets)
+    # Longest segments first, so that the segments still being summed at step j are
+    # always a prefix.
+    order = np.argsort(-lengths, kind="stable")
+    starts = offsets[:-1][order]
+    lengths = lengths[order]
+    totalElms = lengths.astype(float)[:,None]
+    runningAverage = np.zeros((len(lengths), values.shape[1]))
+    active = len(lengths)
+    for j in range(lengths[0] if active else 0):
+        while lengths[active-1] <= j:
+            active -= 1
+        runningAverage[:active] += values[starts[:active]+j]/totalElms[:active]
+    average = np.empty_like(runningAverage)
+    average[order] = runningAverage
+    return average
+
+# Same as BaseLearner.variance on every segment of values.
+def segmentVariance(offsets, values):
+    average = segmentAverage(offsets, values)
+    segments = np.repeat(np.arange(len(offsets)-1), np.diff(offsets))
+    return segmentAverage(offsets, (values-average[segments])**2)
+
+# Same as BaseLearner.getFeatures on every segment of values.
+def segmentFeatures(offsets, values):
+    nUsers = len(offsets)-1
+    starts = offsets[:-1]
+    segments = np.repeat(np.arange(nUsers), np.diff(offsets))
+
+    # BaseLearner.inputParser: sort every user's actions, and take time differences
+    order = np.lexsort((values[:,2], values[:,1], values[:,0], segments))
+    timeStamps = values[order,0]
+    differences = np.delete(np.diff(timeStamps), offsets[1:-1]-1)[:,None]
+    diffOffsets = offsets - np.arange(nUsers+1)
+
+    features = [
+        segmentAverage(offsets, values),
+        segmentVariance(offsets, values),
+        segmentAverage(diffOffsets, differences),
+        segmentVariance(diffOffsets, differences),
+    ]
+    minimum = lambda column: np.minimum.reduceat(values[:,column], starts)[:,None]
+    maximum = lambda column: np.maximum.reduceat(values[:,column], starts)[:,None]
+    features += [
+        np.diff(offsets).astype(float)[:,None],
+        minimum(0),
+        maximum(0),
+        minimum(2),
+        maximum(2),
+        minimum(1),
+        maximum(1),
+    ]
+    return np.hstack(features)
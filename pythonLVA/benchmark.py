@@ -0,0 +1,176 @@
+#!/usr/bin/python
+"""
+Benchmarks every stage of the pipeline on a synthetic data set (see syntheticNF):
+getData, getSplitData, feature extraction, and learn/predict for every learner.
+Times and memory use of every stage are written to a JSON report, so that runs on
+different commits can be compared.
+Python allocations are only traced (with tracemalloc) when asked for, since tracing
+slows stages down a lot: compare the times of runs without tracing.
+Can be called from the command line.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import dataProcessing
+import syntheticNF
+from baseLearner import BaseLearner
+
+# Learner modules benchmarked by default. Each has a Learner() factory.
+learnerModules = [
+    "simpleLearner",
+    "linReg",
+    "decision",
+    "decisionReg",
+    "hmmLearner",
+    "partitionHmmLearner",
+    "combinationLearner",
+]
+
+# Runs fn, and measures it.
+# Arguments
+#   stages: list to append the measurements to.
+#   name: name of the stage.
+#   items: number of items (files, users, ...) processed by the stage.
+#   fn: function to run, without arguments.
+#   traceMemory: whether to record the peak of Python allocations (which slows fn).
+# Output
+#   whatever fn returns, or None if it raised an exception (which is recorded).
+def runStage(stages, name, items, fn, traceMemory=False):
+    print("Benchmarking", name)
+    if traceMemory:
+        tracemalloc.start()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    result = None
+    error = None
+    try:
+        result = fn()
+    except Exception as e:
+        error = "%s: %s" % (type(e).__name__, e)
+    wall = time.perf_counter()-wall
+    cpu = time.process_time()-cpu
+    peak = None
+    if traceMemory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    stages.append({
+        "stage": name,
+        "items": items,
+        "wallSeconds": wall,
+        "cpuSeconds": cpu,
+        "itemsPerSecond": items/wall if wall > 0 else None,
+        "peakTracedBytes": peak,
+        # ru_maxrss is in kilobytes on linux
+        "maxRSSBytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024,
+        "error": error,
+    })
+    return result
+
+def gitCommit():
+    try:
+        directory = os.path.dirname(os.path.abspath(__file__))
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=directory,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Arguments
+#   workDir: directory for the synthetic data set and the pickles. Runs start cold:
+#     pickles left there by a previous run are removed.
+#   nUsers, nMovies, ratingsPerUser, skew, seed: synthetic data set (see
+#     syntheticNF.generate).
+#   nLearning, nTesting: number of users to learn from, and to predict.
+#   learners: learner modules to benchmark.
+#   traceMemory: whether to record the peak of Python allocations of every stage.
+#     Times are then not comparable to runs without it.
+# Output
+#   the report, as a dictionary.
+def benchmark(workDir, nUsers=1000, nMovies=100, ratingsPerUser=50, skew=1.0, seed=0,
+              nLearning=500, nTesting=500, learners=learnerModules, traceMemory=False):
+    dataDir = os.path.join(workDir, "download")
+    if not os.path.exists(dataDir):
+        syntheticNF.generate(dataDir, nUsers, nMovies, ratingsPerUser, skew, seed)
+    dataProcessing.dataDirectory = os.path.abspath(dataDir)
+    nFiles = len(dataProcessing.getDataPathList())
+
+    cwd = os.getcwd()
+    os.chdir(workDir)
+    try:
+        for f in ["pickleDataFile", "pickleTrainFile", "pickleTestFile"]:
+            if os.path.exists(f):
+                os.remove(f)
+        stages = []
+        mapped = runStage(stages, "getData", nFiles, dataProcessing.getData, traceMemory)
+        nActions = sum(len(a) for a in mapped.values())
+        del mapped
+        train,test = runStage(stages, "getSplitData", nActions, dataProcessing.getSplitData, traceMemory)
+
+        customerIDs = sorted(train)
+        userActions = [train[c] for c in customerIDs]
+        runStage(stages, "getFeatures", len(customerIDs), lambda: BaseLearner().getFeaturesBatch(userActions), traceMemory)
+
+        rng = random.Random(seed)
+        learnIDs = rng.sample(customerIDs, min(nLearning, len(customerIDs)))
+        testIDs = rng.sample(customerIDs, min(nTesting, len(customerIDs)))
+        data = [(c, train[c], test[c]) for c in learnIDs]
+        users = [(c, train[c]) for c in testIDs]
+        periods = [test[c][1] for c in testIDs]
+        for name in learners:
+            module = runStage(stages, "import:"+name, 1, lambda: importlib.import_module(name), traceMemory)
+            if module is None:
+                continue
+            learner = module.Learner()()
+            runStage(stages, "learn:"+name, len(data), lambda: learner.learn(data), traceMemory)
+            runStage(stages, "predict:"+name, len(users), lambda: learner.predictBatch(users, periods), traceMemory)
+    finally:
+        os.chdir(cwd)
+
+    return {
+        "commit": gitCommit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {
+            "users": nUsers,
+            "movies": nMovies,
+            "ratingsPerUser": ratingsPerUser,
+            "skew": skew,
+            "seed": seed,
+            "nLearning": nLearning,
+            "nTesting": nTesting,
+            "traceMemory": traceMemory,
+        },
+        "stages": stages,
+    }
+
+# Called from the command line
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the LVA pipeline on synthetic data")
+    parser.add_argument("--workdir", default="benchmarkData", help="directory for the data set and pickles")
+    parser.add_argument("--report", default="benchmark.json", help="path of the JSON report")
+    parser.add_argument("--users", type=int, default=1000, help="number of customers")
+    parser.add_argument("--movies", type=int, default=100, help="number of movies")
+    parser.add_argument("--ratings", type=int, default=50, help="average ratings per customer")
+    parser.add_argument("--skew", type=float, default=1.0, help="power law exponent of activity")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--learning", type=int, default=500, help="number of users to learn from")
+    parser.add_argument("--testing", type=int, default=500, help="number of users to predict")
+    parser.add_argument("--learners", nargs="+", default=learnerModules, help="learner modules")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="record peak Python allocations (slows the stages, so times are not comparable)")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    report = benchmark(args.workdir, args.users, args.movies, args.ratings, args.skew, args.seed,
+                       args.learning, args.testing, args.learners, args.trace_memory)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    for stage in report["stages"]:
+        print("%-32s %10.3fs %s" % (stage["stage"], stage["wallSeconds"], stage["error"] or ""))
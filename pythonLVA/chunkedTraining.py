@@ -0,0 +1,86 @@
+#!/usr/bin/python
+"""
+Out of core training of the feature based learners on every valid customer.
+The features of the customers are read one chunk at a time (from the feature cache
+when it is in use, see featureCache), and the learners learn from the chunks with
+learnChunks, so memory use depends on the chunk size, not on the number of customers.
+learnChunks(blocks) is the out of core version of learn. blocks is a function without
+arguments, that returns a new iterator of (X, y) blocks every time it is called: the
+features of a chunk of users, and their rates (number of actions per second of their
+test period).
+Learners with learnChunks: LinearRegressionLearner (linReg), and
+DecisionTreeRegressionLearner (decisionReg).
+Can be called from the command line.
+"""
+
+import argparse
+import importlib
+import random
+import time
+import numpy as np
+import featureCache
+import metrics
+from baseLearner import BaseLearner
+from dataProcessing import getSplitData, getSplitStore
+from testMethod import getError
+
+# Yields the (X, y) blocks of learnChunks.
+# Arguments
+#   train, test: train/test split (dictionaries or stores).
+#   chunkSize: number of customers per block.
+#   customerIDs: customers to use. None uses every customer of test.
+def featureBlocks(train, test, chunkSize=50000, customerIDs=None):
+    if customerIDs is None:
+        customerIDs = sorted(test.keys())
+    learner = BaseLearner()
+    for start in range(0, len(customerIDs), chunkSize):
+        chunk = customerIDs[start:start+chunkSize]
+        X = learner.getFeatureMatrix(chunk, [train[c] for c in chunk])
+        y = np.array([number/duration for number,duration in (test[c] for c in chunk)], dtype=float)
+        yield X, y
+
+# Same as testMethod.getLearner, but learns from every customer, chunkSize at a time.
+# Arguments
+#   Learner: learner factory (e.g. linReg.Learner()).
+# Output
+#   the trained learner.
+def getLearnerChunked(train, test, Learner, chunkSize=50000, customerIDs=None):
+    learner = Learner()
+    if customerIDs is None:
+        customerIDs = sorted(test.keys())
+    blocks = lambda: featureBlocks(train, test, chunkSize, customerIDs)
+    with metrics.stage("learnChunks:"+learner.name, len(customerIDs)):
+        learner.learnChunks(blocks)
+    return learner
+
+# Called from the command line
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a feature based learner on every customer")
+    parser.add_argument("--learner", default="decisionReg", help="learner module")
+    parser.add_argument("--chunk", type=int, default=50000, help="customers per chunk")
+    parser.add_argument("--testing", type=int, default=20000, help="number of testing samples")
+    parser.add_argument("--stores", action="store_true", help="use the memory mapped data stores")
+    parser.add_argument("--save", default=None, help="directory to save the trained learner in")
+    args = parser.parse_args()
+    Learner = importlib.import_module(args.learner).Learner()
+    if not hasattr(Learner(), "learnChunks"):
+        parser.error("%s cannot learn from chunks (learners that can: linReg, decisionReg)" % args.learner)
+
+    if args.stores:
+        train, test = getSplitStore()
+        featureCache.useFeatureCache(train)
+    else:
+        train, test = getSplitData()
+        featureCache.useFeatureCache(train)
+    print("Data acquisition complete.")
+
+    start = time.time()
+    learner = getLearnerChunked(train, test, Learner, args.chunk)
+    print("Learned from %d customers in %fs" % (len(test), time.time()-start))
+    if args.save is not None:
+        learner.save(args.save)
+
+    nTesting = min(args.testing, len(test))
+    error = getError(train, test, learner, nTesting, random)
+    print("Average error:", error)
+    print("%s\t%d\t%d\t%s" % (learner.name, len(test), nTesting, '\t'.join([str(i) for i in error])))
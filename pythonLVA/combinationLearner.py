@@ -1,5 +1,6 @@
 import partitionHmmLearner
 import simpleLearner
+import persistence
 
 def Learner(clusters=2):
     global learners,alphas
@@ -10,16 +11,28 @@ def Learner(clusters=2):
 
     return lambda: CombinationLearner()
 
-class CombinationLearner:
+class CombinationLearner(persistence.Persistent):
+    # Its HMM learner uses the intervals between actions
+    minActions = 2
+
     def __init__(self):
-        self.name = 'Combination Learner: ' + ','.join([l.name for l in learners])
+        # Keep the learners with the instance, so that saved learners include them
+        self.learners = learners
+        self.alphas = alphas
+        self.name = 'Combination Learner: ' + ','.join([l.name for l in self.learners])
 
     def learn(self, data):
-        for l in learners:
+        for l in self.learners:
             l.learn(data)
 
     def predict(self, user, period):
         prediction = 0
-        for a,l in zip(alphas,learners):
+        for a,l in zip(self.alphas,self.learners):
             prediction += a*l.predict(user, period)
         return prediction
+
+    def predictBatch(self, users, periods):
+        prediction = 0
+        for a,l in zip(self.alphas,self.learners):
+            prediction += a*l.predictBatch(users, periods)
+        return prediction
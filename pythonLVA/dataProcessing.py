@@ -1,26 +1,102 @@
 import parserNF
+import dataStore
+import metrics
 import pickle
 import os
+import io
 import time
 import datetime
+import tarfile
+import collections
+import multiprocessing
+import numpy as np
+from itertools import islice
+from contextlib import contextmanager
+from functools import partial, lru_cache
 
 # Arguments
 #   year,month,day
 # Output
 #   timestamp at midnight of that day, month, and year.
+# This is called for every rating, but there are only a few thousand distinct dates,
+# so the results are memoized.
+@lru_cache(maxsize=1<<14)
 def getTimeStamp(year,month,day):
     # Getting the timestamp
     # http://stackoverflow.com/questions/9223905/python-timestamp-from-day-month-year
     dt = datetime.datetime(year=year, month=month, day=day)
     return time.mktime(dt.timetuple())
     
+# Arguments
+#   dayNumbers: numpy array of dates, as a number of days since 1970-01-01.
+# Output
+#   numpy array with the getTimeStamp of every date. getTimeStamp is only called once
+#   per distinct date.
+def getTimeStamps(dayNumbers):
+    days,inverse = np.unique(dayNumbers, return_inverse=True)
+    epoch = datetime.date(1970,1,1).toordinal()
+    dates = [datetime.date.fromordinal(epoch+day) for day in days.tolist()]
+    table = np.array([getTimeStamp(d.year,d.month,d.day) for d in dates], dtype=float)
+    return table[inverse.reshape(-1)]
+    
+# Directory of the netflix data set, with training_set/ and movie_titles.txt
+dataDirectory = "../download"
+
 # Returns a list with all the data file paths
 def getDataPathList():
-    directory = "../download/training_set"
+    directory = os.path.join(dataDirectory, "training_set")
     return [os.path.join(directory, f) for f in os.listdir(directory)]
 
 def getMoviesPath():
-    return "../download/movie_titles.txt"
+    return os.path.join(dataDirectory, "movie_titles.txt")
+
+# Archives of the training_set directory, which are read when it is not extracted.
+archiveNames = [
+    "training_set.tar",
+    "training_set.tar.gz",
+    "training_set.tgz",
+    "training_set.tar.xz",
+    "training_set.tar.bz2",
+]
+
+# Returns the path of the training set archive, or None if the training_set directory
+# is there (or there is no archive).
+def getArchivePath():
+    if os.path.isdir(os.path.join(dataDirectory, "training_set")):
+        return None
+    for name in archiveNames:
+        path = os.path.join(dataDirectory, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+# Generator of (name, contents) of the data files in a training set archive, in
+# archive order. The archive is streamed (and decompressed on the fly), never
+# extracted.
+def readArchive(archivePath):
+    with tarfile.open(archivePath, "r|*") as archive:
+        for member in archive:
+            if member.isfile():
+                yield (member.name, archive.extractfile(member).read())
+
+# Returns an iterator over the data files of the training set: the paths of the files
+# in the training_set directory or, if only an archive of it is there, the
+# (name, contents) of its members (see readArchive).
+def getDataSources():
+    archivePath = getArchivePath()
+    if archivePath is None:
+        return iter(getDataPathList())
+    return readArchive(archivePath)
+
+# Encoding of the data files (like movie_titles.txt, see parserNF.parseMovies)
+dataEncoding = "ISO-8859-1"
+
+# Opens a data file from getDataSources, as a text file. Files and archive members are
+# decoded the same way: with dataEncoding, and universal newlines.
+def openDataFile(source):
+    if isinstance(source, tuple):
+        return io.TextIOWrapper(io.BytesIO(source[1]), encoding=dataEncoding)
+    return open(source, encoding=dataEncoding)
 
 # MapReduce style function.
 # Gets NetflixDataPoints, and returns tuples with action descriptors:
@@ -59,41 +135,147 @@ def splitFn(actions, fracTrain=0.5):
     
     return (train, len(test), testDuration, valid)
 
-def getData():
+# Parses a list of data files, and reduces their points into a partial map.
+# Used by getData, possibly from a worker process.
+# Arguments
+#   pathList: list of netflix data files (paths, or archive members, see
+#     getDataSources).
+#   movieInfo: information about movies. Created by the parserNF.parseMovies function.
+#   bulk: parse whole files into arrays with parserNF.parseFileArrays, instead of
+#     one NetflixDataPoint at a time. The output is the same, but much faster.
+# Output
+#   map from customerID to a list of (timeStamp,rating,movieYear), in file order.
+def mapFiles(pathList, movieInfo, bulk=False):
+    mapped = {}
+    for path in pathList:
+        with openDataFile(path) as dataFile:
+            if bulk:
+                points = mapFileArrays(dataFile, movieInfo)
+            elif not metrics.enabled:
+                # The parseFile function is a generator.
+                # It parses individual data points, until done with the file.
+                points = map(mapFn, parserNF.parseFile(dataFile,movieInfo))
+            else:
+                # Parsed all at once, so that parsing and mapping are timed separately
+                with metrics.stage("parseFile") as s:
+                    points = list(parserNF.parseFile(dataFile,movieInfo))
+                    s.count(len(points))
+                with metrics.stage("mapFn", len(points)):
+                    points = [mapFn(p) for p in points]
+            for key,value in points:
+                if key in mapped:
+                    mapped[key].append(value)
+                else:
+                    mapped[key] = [value]
+    return mapped
+
+# Bulk version of parserNF.parseFile followed by mapFn.
+# Arguments
+#   dataFile: file object for a netflix data file.
+#   movieInfo: information about movies. Created by the parserNF.parseMovies function.
+# Output
+#   list of (customerID,(timeStamp,rating,movieYear)), in file order. Same as
+#   applying mapFn to every point of parserNF.parseFile.
+def mapFileArrays(dataFile, movieInfo):
+    with metrics.stage("parseFile") as s:
+        movieID,customerIDs,ratings,dayNumbers = parserNF.parseFileArrays(dataFile)
+        s.count(len(customerIDs))
+    with metrics.stage("mapFn", len(customerIDs)):
+        movieYear,movieTitle = movieInfo.get(movieID, None)
+        movieYear = int(movieYear) if movieYear != 'NULL' else 1990
+        timestamps = getTimeStamps(dayNumbers)
+        values = zip(timestamps.tolist(), ratings.tolist(), [movieYear]*len(ratings))
+        return list(zip(customerIDs.tolist(), values))
+
+# Merges a partial map (from mapFiles) into mapped. Partial maps must be merged in
+# the same order as their files, so that every action list keeps the file order.
+def reduceMapped(mapped, partialMap):
+    for key,values in partialMap.items():
+        if key in mapped:
+            mapped[key].extend(values)
+        else:
+            mapped[key] = values
+
+# Same as pool.imap, but only takes up to window items out of items ahead of the
+# results, so that items that are read lazily (like archive members) are not all in
+# memory at once.
+# Output
+#   generator of (item, fn(item)), in the order of items.
+def boundedImap(pool, fn, items, window):
+    pending = collections.deque()
+    for item in items:
+        pending.append((item, pool.apply_async(fn, (item,))))
+        if len(pending) >= window:
+            item,result = pending.popleft()
+            yield (item, result.get())
+    while pending:
+        item,result = pending.popleft()
+        yield (item, result.get())
+
+# Context manager over the generator of (item, fn(item)), in the order of items. With
+# workers other than 1, fn runs in a pool of that many processes (None uses every
+# core), a few items per worker ahead of the results (see boundedImap). The pool is
+# stopped when the with block ends, even if it raises.
+@contextmanager
+def parallelMap(fn, items, workers=1):
+    if workers == 1:
+        yield ((item, fn(item)) for item in items)
+        return
+    pool = multiprocessing.Pool(workers)
+    try:
+        yield boundedImap(pool, fn, items, 2*(workers or os.cpu_count()))
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+# Parses every data file, from the training_set directory, or straight out of its
+# archive (see getDataSources).
+# Arguments
+#   workers: number of processes parsing the data files. With 1, everything is
+#     parsed in this process. None uses every core.
+#   shardSize: number of data files given to a worker at a time.
+#   bulk: parse whole files at once (see mapFiles).
+# Output
+#   map from customerID to a list of (timeStamp,rating,movieYear), for every customer
+#   with 5 or more actions. The result does not depend on the number of workers.
+def parseData(workers=1, shardSize=100, bulk=False):
+    # Parse the points
+    movieInfo = parserNF.parseMovies(getMoviesPath())
+    sources = getDataSources()
+    shards = iter(lambda: list(islice(sources, shardSize)), [])
+
+    # mapped will contain a map from customerID to a list of timeStamps, and ratings
+    mapped = {}
+    # Partial maps come back in shard order
+    i = 0
+    with parallelMap(partial(mapFiles, movieInfo=movieInfo, bulk=bulk), shards, workers) as partials:
+        for shard,result in partials:
+            reduceMapped(mapped, result)
+            i = i+len(shard)
+            print("Processed", i, "files.")
+
+    for customerID in list(mapped.keys()):
+        if len(mapped[customerID]) < 5:
+            del mapped[customerID]
+    return mapped
+
+# Same as parseData, but the result is cached in pickleDataFile.
+def getData(workers=1, shardSize=100, bulk=False):
     # Check if the result already exists, and if it does, return
     print("Processing NetFlix data set")
     try:
         # SO MUCH WIN!!!
-        with open("pickleDataFile", "rb") as f:
+        with open("pickleDataFile", "rb") as f, metrics.stage("pickleLoad:data"):
             mapped = pickle.load(f)
     except FileNotFoundError:
-        # Parse the points
-        movieInfo = parserNF.parseMovies(getMoviesPath())
-    
-        # mapped will contain a map from customerID to a list of timeStamps, and ratings
-        mapped = {}
-        i = 0
-        for path in getDataPathList():
-            if i%100 == 0:
-                print("Processed", i, "files.")
-            i = i+1
-            with open(path) as dataFile:
-                # The parseFile function is a generator.
-                # It parses individual data points, until done with the file.
-                parser = parserNF.parseFile(dataFile,movieInfo)
-                for dataPoint in parser:
-                    key,value = mapFn(dataPoint)
-                    if key in mapped:
-                        mapped[key].append(value)
-                    else:
-                        mapped[key] = [value]
-    
-        for customerID in list(mapped.keys()):
-            if len(mapped[customerID]) < 5:
-                del mapped[customerID]
+        mapped = parseData(workers, shardSize, bulk)
 
         # This is a heavy operation, so save the results
-        with open("pickleDataFile", "wb") as f:
+        with open("pickleDataFile", "wb") as f, metrics.stage("pickleDump:data"):
             p = pickle.Pickler(f)
             p.fast = True
             p.dump(mapped)
@@ -104,7 +286,8 @@ def getSplitData():
     print("Splitting NetFlix dataset")
     try:
         # EVEN MORE WIN!!
-        with open("pickleTrainFile", "rb") as f, open("pickleTestFile", "rb") as t:
+        with open("pickleTrainFile", "rb") as f, open("pickleTestFile", "rb") as t, \
+             metrics.stage("pickleLoad:split"):
             train = pickle.load(f)
             test = pickle.load(t)
     except FileNotFoundError:
@@ -112,15 +295,17 @@ def getSplitData():
         # Get the train/test splits.
         train = {}
         test = {}
-        for customerID,actions in mapped.items():
-            trainActions, testResult, testDuration, valid = splitFn(actions)
-            if valid:
-                train[customerID] = trainActions
-                test[customerID] = (testResult, testDuration)
+        with metrics.stage("splitFn", len(mapped)):
+            for customerID,actions in mapped.items():
+                trainActions, testResult, testDuration, valid = splitFn(actions)
+                if valid:
+                    train[customerID] = trainActions
+                    test[customerID] = (testResult, testDuration)
         del mapped
 
         # Heavy operation, save the results
-        with open("pickleTrainFile", "wb") as f, open("pickleTestFile", "wb") as t:
+        with open("pickleTrainFile", "wb") as f, open("pickleTestFile", "wb") as t, \
+             metrics.stage("pickleDump:split"):
             pTrain = pickle.Pickler(f)
             pTest = pickle.Pickler(t)
             pTrain.fast = True
@@ -129,3 +314,47 @@ def getSplitData():
             pTest.dump(test)
     print("Done Splitting")
     return (train, test)
+
+# Columnar versions of getData and getSplitData (see dataStore). They return
+# memory mapped stores, which behave like the dictionaries returned by getData and
+# getSplitData, but load almost instantly.
+# With compactDays, new stores keep timestamps as 2 byte day numbers.
+def getDataStore(workers=1, shardSize=100, bulk=False, compactDays=False):
+    print("Loading NetFlix data store")
+    if not os.path.exists("dataStore"):
+        # Reuse the pickled data if it is there, otherwise parse without pickling
+        if os.path.exists("pickleDataFile"):
+            mapped = getData()
+        else:
+            mapped = parseData(workers, shardSize, bulk)
+        dataStore.saveActions(mapped, "dataStore", compactDays)
+        del mapped
+    print("Done Loading")
+    return dataStore.ActionStore("dataStore")
+
+def getSplitStore(compactDays=False):
+    print("Loading NetFlix split stores")
+    if not (os.path.exists("trainStore") and os.path.exists("testStore")):
+        mapped = getDataStore(compactDays=compactDays)
+        # The data store is sorted by customer, so the splits can be written as we go
+        train = dataStore.StoreWriter("trainStore", dataStore.actionColumns, True,
+                                      compactDays=compactDays)
+        test = dataStore.StoreWriter("testStore", dataStore.resultColumns, False)
+        for customerID,actions in mapped.items():
+            trainActions, testResult, testDuration, valid = splitFn(actions)
+            if valid:
+                train.add(customerID, trainActions)
+                test.add(customerID, (testResult, testDuration))
+        train.close()
+        test.close()
+    print("Done Loading")
+    return (dataStore.ActionStore("trainStore"), dataStore.ResultStore("testStore"))
+
+# Same as getDataStore, with the actions of every customer sorted the way splitFn
+# sorts them. Split views (see splitViews) are built on it.
+def getSortedStore(compactDays=False):
+    print("Loading NetFlix sorted store")
+    if not os.path.exists("sortedStore"):
+        dataStore.sortStore(getDataStore(compactDays=compactDays), "sortedStore")
+    print("Done Loading")
+    return dataStore.ActionStore("sortedStore")
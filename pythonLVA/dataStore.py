@@ -0,0 +1,282 @@
+#!/usr/bin/python
+"""
+Columnar on-disk storage for the customer maps built in dataProcessing.
+The pickled dictionaries take a long time, and a lot of memory, to load. A store is
+a directory of flat binary arrays that are memory mapped when loaded, so opening one
+is almost instant and its pages are shared between processes.
+"""
+
+import datetime
+import json
+import os
+import shutil
+from collections.abc import Mapping
+import numpy as np
+import dataProcessing
+
+"""
+Store layout (all arrays are raw little-endian binary files, described by meta.json):
+customers.bin - sorted customerIDs.
+offsets.bin - for action stores, the actions of customers[i] are the rows
+              offsets[i]:offsets[i+1] of the column arrays (CSR layout).
+<column>.bin - one file per column.
+dayTable.bin - for stores saved with compactDays, the timestamp of every day from
+               meta["firstDay"] on (NaN for days without actions).
+
+Action stores hold maps from customerID to a list of (timeStamp,rating,movieYear),
+like the data returned by getData and the train data returned by getSplitData.
+Result stores hold maps from customerID to (testNumber,testDuration), like the test
+data returned by getSplitData.
+
+With compactDays, action timestamps are stored as 2 byte day numbers (days since
+1970-01-01, in local time) instead of 8 byte floats, and turned back into the exact
+original timestamps with the day table. This only works for the timestamps that
+dataProcessing.getTimeStamp produces: local midnight, or the first time of the day on
+days whose midnight is skipped by daylight saving time.
+"""
+
+# Columns of an action store, in the order of the action tuples
+actionColumns = [
+    ("timestamps", "<f8"),
+    ("ratings", "<i1"),
+    ("movieYears", "<i2"),
+]
+
+# Replaces the timestamps column in stores saved with compactDays
+dayColumn = ("days", "<i2")
+
+# Columns of a result store, in the order of the result tuples
+resultColumns = [
+    ("testNumbers", "<i8"),
+    ("testDurations", "<f8"),
+]
+
+epochOrdinal = datetime.date(1970,1,1).toordinal()
+
+def _open(path, name, dtype, length):
+    if length == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(os.path.join(path, name + ".bin"), dtype=dtype, mode="r", shape=(length,))
+
+# Writes a store one customer at a time, so that a store can be produced without
+# having the whole map in memory. Customers must be added in increasing order.
+# The store only appears at path once close is called.
+class StoreWriter():
+    # Arguments
+    #   path: directory of the store. It is replaced if it exists.
+    #   columns: actionColumns or resultColumns.
+    #   ragged: True for action stores (many rows per customer), False for result
+    #     stores (one row per customer).
+    #   bufferSize: number of rows kept in memory before writing them out.
+    #   compactDays: store the timestamps of an action store as day numbers.
+    def __init__(self, path, columns, ragged, bufferSize=1<<20, compactDays=False):
+        self.path = path
+        self.tmpPath = path + ".tmp"
+        self.compactDays = compactDays
+        if compactDays:
+            columns = [dayColumn if c == actionColumns[0] else c for c in columns]
+            # Maps from timestamps to day numbers, and back
+            self.dayOf = {}
+            self.timeStampOf = {}
+        self.columns = columns
+        self.ragged = ragged
+        self.bufferSize = bufferSize
+        if os.path.exists(self.tmpPath):
+            shutil.rmtree(self.tmpPath)
+        os.makedirs(self.tmpPath)
+        names = ["customers"] + (["offsets"] if ragged else []) + [c for c,_ in columns]
+        self.files = {name: open(os.path.join(self.tmpPath, name + ".bin"), "wb") for name in names}
+        self.buffers = {name: [] for name in names}
+        self.nCustomers = 0
+        self.nRows = 0
+        self.lastCustomer = None
+        if ragged:
+            self.buffers["offsets"].append(0)
+
+    # Arguments
+    #   customerID: must be larger than every customerID added before.
+    #   row: for action stores, a list of (timeStamp,rating,movieYear). For result
+    #     stores, a (testNumber,testDuration) tuple.
+    def add(self, customerID, row):
+        if self.lastCustomer is not None and customerID <= self.lastCustomer:
+            raise ValueError("Customers must be added in increasing order")
+        self.lastCustomer = customerID
+        self.buffers["customers"].append(customerID)
+        self.nCustomers += 1
+        if self.ragged:
+            if self.compactDays:
+                row = [(self.getDay(t),r,y) for t,r,y in row]
+            for (name,_),values in zip(self.columns, zip(*row)):
+                self.buffers[name].extend(values)
+            self.nRows += len(row)
+            self.buffers["offsets"].append(self.nRows)
+        else:
+            for (name,_),value in zip(self.columns, row):
+                self.buffers[name].append(value)
+            self.nRows += 1
+        if len(self.buffers[self.columns[0][0]]) >= self.bufferSize:
+            self.flush()
+
+    # Returns the day number of a timestamp of dataProcessing.getTimeStamp.
+    def getDay(self, timestamp):
+        day = self.dayOf.get(timestamp)
+        if day is None:
+            d = datetime.datetime.fromtimestamp(timestamp).date()
+            if dataProcessing.getTimeStamp(d.year, d.month, d.day) != timestamp:
+                raise ValueError("Only timestamps of getTimeStamp can be stored as days")
+            day = d.toordinal() - epochOrdinal
+            self.dayOf[timestamp] = day
+            self.timeStampOf[day] = timestamp
+        return day
+
+    def flush(self):
+        dtypes = dict(self.columns, customers="<i8", offsets="<i8")
+        for name,values in self.buffers.items():
+            if values:
+                np.array(values, dtype=dtypes[name]).tofile(self.files[name])
+                values.clear()
+
+    def close(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+        meta = {
+            "customers": self.nCustomers,
+            "rows": self.nRows,
+            "ragged": self.ragged,
+            "columns": self.columns,
+        }
+        if self.compactDays:
+            firstDay = min(self.timeStampOf, default=0)
+            dayTable = np.full(max(self.timeStampOf, default=-1)-firstDay+1, np.nan)
+            for day,timestamp in self.timeStampOf.items():
+                dayTable[day-firstDay] = timestamp
+            dayTable.astype("<f8").tofile(os.path.join(self.tmpPath, "dayTable.bin"))
+            meta["firstDay"] = firstDay
+        with open(os.path.join(self.tmpPath, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.rename(self.tmpPath, self.path)
+
+# Arguments
+#   mapped: map from customerID to a list of (timeStamp,rating,movieYear).
+#   path: directory to save the store in.
+#   compactDays: store timestamps as day numbers (see above).
+def saveActions(mapped, path, compactDays=False):
+    writer = StoreWriter(path, actionColumns, True, compactDays=compactDays)
+    for customerID in sorted(mapped):
+        writer.add(customerID, mapped[customerID])
+    writer.close()
+
+# Arguments
+#   results: map from customerID to (testNumber,testDuration).
+#   path: directory to save the store in.
+def saveResults(results, path):
+    writer = StoreWriter(path, resultColumns, False)
+    for customerID in sorted(results):
+        writer.add(customerID, results[customerID])
+    writer.close()
+
+# Saves a copy of an action store with the actions of every customer sorted, in the
+# order splitFn sorts them (by timeStamp, then rating, then movieYear).
+# Arguments
+#   store: ActionStore.
+#   path: directory to save the sorted store in.
+#   chunkRows: approximate number of rows sorted at a time.
+def sortStore(store, path, chunkRows=1<<24):
+    tmpPath = path + ".tmp"
+    if os.path.exists(tmpPath):
+        shutil.rmtree(tmpPath)
+    os.makedirs(tmpPath)
+    with open(os.path.join(store.path, "meta.json")) as f:
+        columns = json.load(f)["columns"]
+    files = {name: open(os.path.join(tmpPath, name + ".bin"), "wb") for name,_ in columns}
+    # Days sort the same way as the timestamps they stand for
+    timeColumn = columns[0][0]
+    offsets = np.asarray(store.offsets)
+    i = 0
+    while i < len(store):
+        j = min(max(int(np.searchsorted(offsets, offsets[i]+chunkRows, side="right"))-1, i+1), len(store))
+        start,end = offsets[i],offsets[j]
+        segments = np.repeat(np.arange(j-i), np.diff(offsets[i:j+1]))
+        order = start + np.lexsort((store.movieYears[start:end], store.ratings[start:end],
+                                    getattr(store, timeColumn)[start:end], segments))
+        for name,_ in columns:
+            getattr(store, name)[order].tofile(files[name])
+        i = j
+    for f in files.values():
+        f.close()
+    for name in ["customers.bin", "offsets.bin", "dayTable.bin", "meta.json"]:
+        if os.path.exists(os.path.join(store.path, name)):
+            shutil.copy(os.path.join(store.path, name), os.path.join(tmpPath, name))
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmpPath, path)
+
+# Read-only map over a saved store. Subclasses turn rows back into the values the
+# learners consume.
+class Store(Mapping):
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        nCustomers = meta["customers"]
+        self.customers = _open(path, "customers", "<i8", nCustomers)
+        if meta["ragged"]:
+            self.offsets = _open(path, "offsets", "<i8", nCustomers+1)
+        for name,dtype in meta["columns"]:
+            setattr(self, name, _open(path, name, dtype, meta["rows"]))
+        self.firstDay = meta.get("firstDay")
+        if self.firstDay is not None:
+            self.dayTable = np.fromfile(os.path.join(path, "dayTable.bin"), dtype="<f8")
+
+    # Returns the position of customerID in the store, raising KeyError if missing.
+    def index(self, customerID):
+        i = int(np.searchsorted(self.customers, customerID))
+        if i == len(self.customers) or self.customers[i] != customerID:
+            raise KeyError(customerID)
+        return i
+
+    def __iter__(self):
+        return iter(self.customers.tolist())
+
+    def __len__(self):
+        return len(self.customers)
+
+    def __contains__(self, customerID):
+        try:
+            self.index(customerID)
+        except KeyError:
+            return False
+        return True
+
+class ActionStore(Store):
+    # Returns the (timestamps, ratings, movieYears) arrays of a customer, without
+    # copying them (except for timestamps stored as days).
+    def arrays(self, customerID):
+        i = self.index(customerID)
+        start,end = self.offsets[i],self.offsets[i+1]
+        if self.firstDay is None:
+            timestamps = self.timestamps[start:end]
+        else:
+            timestamps = self.dayTable[self.days[start:end]-self.firstDay]
+        return (timestamps, self.ratings[start:end], self.movieYears[start:end])
+
+    # Stores saved with compactDays only build the full timestamps array when asked.
+    def __getattr__(self, name):
+        if name == "timestamps" and self.__dict__.get("firstDay") is not None:
+            self.timestamps = self.dayTable[self.days-self.firstDay]
+            return self.timestamps
+        raise AttributeError(name)
+
+    # Returns the actions of a customer as a list of (timeStamp,rating,movieYear), the
+    # same way they were saved.
+    def __getitem__(self, customerID):
+        return list(zip(*[column.tolist() for column in self.arrays(customerID)]))
+
+class ResultStore(Store):
+    # Returns (testNumber,testDuration) for a customer.
+    def __getitem__(self, customerID):
+        i = self.index(customerID)
+        return (int(self.testNumbers[i]), float(self.testDurations[i]))
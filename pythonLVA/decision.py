@@ -13,8 +13,8 @@ class DecisionTreeLearner(BaseLearner):
         self.name = "DecisionTreeLearner"
 
     def learn(self, data):
-        _,train,result = zip(*data)
-        X = [self.getFeatures(u) for u in train]
+        IDs,train,result = zip(*data)
+        X = self.getFeatureMatrix(IDs, train)
         y = [number/duration for number,duration in result]
         
         self.model = tree.DecisionTreeClassifier(max_depth=6)
@@ -40,8 +40,15 @@ class DecisionTreeLearner(BaseLearner):
 
     def predict(self, user, period):
         ID,actions = user
-        rate = self.model.predict(self.getFeatures(actions))[0]
+        rate = self.model.predict(self.getFeatureMatrix([ID], [actions]))[0]
         return rate*period
 
+    # Same as predict, with a single model call for all users.
+    def predictBatch(self, users, periods):
+        IDs,actions = zip(*users)
+        X = self.getFeatureMatrix(IDs, actions)
+        rate = self.model.predict(X)
+        return rate*np.asarray(periods, dtype=float)
+
 def Learner():
     return lambda: DecisionTreeLearner()
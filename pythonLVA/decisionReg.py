@@ -5,6 +5,7 @@ Use rate to do prediction
 """
 from sklearn import tree
 from baseLearner import BaseLearner
+from histTree import HistogramTreeRegressor
 import numpy as np
 import code
 
@@ -13,8 +14,8 @@ class DecisionTreeRegressionLearner(BaseLearner):
         self.name = "DecisionTreeRegressionLearner"
 
     def learn(self, data):
-        _,train,result = zip(*data)
-        X = [self.getFeatures(u) for u in train]
+        IDs,train,result = zip(*data)
+        X = self.getFeatureMatrix(IDs, train)
         y = [number/duration for number,duration in result]
         
         self.model = tree.DecisionTreeRegressor(max_depth=6,min_samples_leaf=100)
@@ -37,11 +38,23 @@ class DecisionTreeRegressionLearner(BaseLearner):
                 "Worst rating",
                 "Best rating",
             ])
+
+    # Same tree as learn, with the thresholds restricted to the edges of histogram bins
+    # (see histTree).
+    def learnChunks(self, blocks):
+        self.model = HistogramTreeRegressor(maxDepth=6, minSamplesLeaf=100).fit(blocks)
         
     def predict(self, user, period):
         ID,actions = user
-        rate = self.model.predict(self.getFeatures(actions))[0]
+        rate = self.model.predict(self.getFeatureMatrix([ID], [actions]))[0]
         return rate*period
 
+    # Same as predict, with a single model call for all users.
+    def predictBatch(self, users, periods):
+        IDs,actions = zip(*users)
+        X = self.getFeatureMatrix(IDs, actions)
+        rate = self.model.predict(X)
+        return rate*np.asarray(periods, dtype=float)
+
 def Learner():
     return lambda: DecisionTreeRegressionLearner()
@@ -3,6 +3,7 @@ This file contains error calculating functions
 """
 
 import math
+import numpy as np
 
 def percentError(predicted,actual):
     return abs(predicted/actual-1.)
@@ -21,3 +22,57 @@ def underError(predicted,actual):
 
 def overError(predicted,actual):
     return percentError(predicted,actual) if predicted>actual else 0
+
+# Array versions of the functions above. They take arrays of predictions and actual
+# values, and give the same values, element by element.
+
+def percentErrors(predicted,actual):
+    return np.abs(predicted/actual-1.)
+
+def squareErrors(predicted,actual):
+    return (predicted-actual)**2
+
+def magErrors(predicted,actual):
+    positive = predicted > 0
+    predOrder = np.where(positive, np.log(np.where(positive, predicted, 1.)), -1)
+    actualOrder = np.where(positive, np.log(np.where(positive, actual, 1.)), -1)
+    return np.abs(predOrder-actualOrder)
+
+def underErrors(predicted,actual):
+    return np.where(predicted<actual, percentErrors(predicted,actual), 0.)
+
+def overErrors(predicted,actual):
+    return np.where(predicted>actual, percentErrors(predicted,actual), 0.)
+
+# Array version of every error function
+vectorized = {
+    percentError: percentErrors,
+    squareError: squareErrors,
+    magError: magErrors,
+    underError: underErrors,
+    overError: overErrors,
+}
+
+# Bootstrap confidence interval of the mean of every row of errors.
+# Arguments
+#   errors: array of shape (number of error functions, number of samples).
+#   nBootstrap: number of resamples.
+#   confidence: confidence level of the interval.
+#   seed: seed of the resampling.
+#   chunkSize: number of resamples drawn at once (bounds memory use).
+# Output
+#   (lower, upper), arrays with one bound for every row of errors.
+def bootstrapInterval(errors, nBootstrap=1000, confidence=0.95, seed=None, chunkSize=100):
+    errors = np.asarray(errors, dtype=float)
+    n = errors.shape[1]
+    rng = np.random.default_rng(seed)
+    means = np.empty((nBootstrap, errors.shape[0]))
+    for start in range(0, nBootstrap, chunkSize):
+        size = min(chunkSize, nBootstrap-start)
+        # How many times every sample is drawn in each resample
+        draws = rng.integers(0, n, (size, n)) + n*np.arange(size)[:,None]
+        counts = np.bincount(draws.ravel(), minlength=size*n).reshape(size, n)
+        means[start:start+size] = counts @ errors.T / n
+    tail = (1.-confidence)/2*100
+    lower, upper = np.percentile(means, [tail, 100-tail], axis=0)
+    return lower, upper
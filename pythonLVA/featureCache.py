@@ -0,0 +1,158 @@
+#!/usr/bin/python
+"""
+Persistent cache of the features (BaseLearner.getFeatures) of every customer of a
+train split. Features are computed once per split, saved in the same flat binary
+layout as dataStore, and memory mapped when loaded.
+The cache is keyed by the train file it was computed from, and by the source code of
+the feature functions, so it is rebuilt whenever either of them changes. Caches of
+different train files (a pickle, a store) are kept side by side.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import numpy as np
+import baseLearner
+import dataStore
+
+# Functions that define the features. Changing any of them invalidates the cache.
+featureFunctions = [
+    baseLearner.BaseLearner.inputParser,
+    baseLearner.BaseLearner.average,
+    baseLearner.BaseLearner.variance,
+    baseLearner.BaseLearner.getFeatures,
+    baseLearner.segmentAverage,
+    baseLearner.segmentVariance,
+    baseLearner.segmentFeatures,
+]
+
+# Returns a string that changes whenever the file (or store directory) at path changes.
+def datasetVersion(path):
+    paths = [path]
+    if os.path.isdir(path):
+        paths = sorted(os.path.join(path, f) for f in os.listdir(path))
+    stats = [os.stat(p) for p in paths]
+    return ";".join("%s:%d:%d" % (p, s.st_size, s.st_mtime_ns) for p,s in zip(paths, stats))
+
+# Returns the file (or store directory) a train split was loaded from: the directory of
+# a store, or of the store under a split view (see splitViews), or else default.
+def sourcePath(train, default="pickleTrainFile"):
+    if isinstance(train, dataStore.Store):
+        split = getattr(train, "split", None)
+        return train.path if split is None else split.store.path
+    return default
+
+# Returns a description of the split of a split view, or "" for other train splits.
+def splitDescription(train):
+    split = getattr(train, "split", None)
+    if split is None:
+        return ""
+    return "|%r|%r|%r" % (split.fracTrain, split.cutoff, split.end)
+
+# Returns a string that changes whenever the data of a train split changes: the
+# version of its source (trainPath, or else sourcePath), and the split of a split view.
+def trainVersion(train, trainPath=None):
+    return datasetVersion(trainPath or sourcePath(train)) + splitDescription(train)
+
+# Returns a string that changes whenever the definition of the features changes.
+def featureVersion():
+    return "".join(inspect.getsource(f) for f in featureFunctions)
+
+# Cached features of every customer in a train split.
+class FeatureCache():
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        shape = (meta["customers"], meta["features"])
+        if shape[0] == 0:
+            self.customers = np.zeros(0, dtype="<i8")
+            self.features = np.zeros(shape)
+        else:
+            self.customers = np.memmap(os.path.join(path, "customers.bin"), dtype="<i8", mode="r", shape=shape[:1])
+            self.features = np.memmap(os.path.join(path, "features.bin"), dtype="<f8", mode="r", shape=shape)
+
+    # Arguments
+    #   customerIDs: list of customers.
+    #   userActions: their actions, to check that they are the actions the cache was
+    #     computed from.
+    # Output
+    #   (rows, found): the cached feature rows of the customers, and a boolean array
+    #   with False for customers that are not in the cache, or whose actions are not
+    #   the cached ones (their rows are garbage).
+    def lookup(self, customerIDs, userActions):
+        customerIDs = np.asarray(customerIDs, dtype=np.int64)
+        if len(self.customers) == 0:
+            rows = np.zeros((len(customerIDs), self.features.shape[1]))
+            return (rows, np.zeros(len(customerIDs), dtype=bool))
+        indices = np.minimum(np.searchsorted(self.customers, customerIDs), len(self.customers)-1)
+        rows = self.features[indices]
+        # Cheap check: number of actions, earliest and most recent timestamp
+        summary = np.array([(len(u), min(u)[0], max(u)[0]) for u in userActions], dtype=float)
+        found = (self.customers[indices] == customerIDs) & (rows[:,8:11] == summary.reshape(-1,3)).all(axis=1)
+        return (rows, found)
+
+# Computes and saves the features of every customer in train.
+# Arguments
+#   train: map from customerID to a list of (timeStamp,rating,movieYear), like the train
+#     data returned by getSplitData (a dictionary or a dataStore.ActionStore).
+#   path: directory to save the cache in.
+#   chunkSize: number of customers whose features are computed at once.
+def saveFeatures(train, path, chunkSize=50000):
+    tmpPath = path + ".tmp"
+    if os.path.exists(tmpPath):
+        shutil.rmtree(tmpPath)
+    os.makedirs(tmpPath)
+    customers = np.array(sorted(train), dtype="<i8")
+    learner = baseLearner.BaseLearner()
+    nFeatures = 15
+    with open(os.path.join(tmpPath, "features.bin"), "wb") as f:
+        for i in range(0, len(customers), chunkSize):
+            if isinstance(train, dataStore.ActionStore):
+                # Stores are already in CSR layout, sorted by customer
+                offsets = np.array(train.offsets[i:i+chunkSize+1])
+                start,end = offsets[0],offsets[-1]
+                values = np.column_stack([train.timestamps[start:end],
+                    train.ratings[start:end], train.movieYears[start:end]]).astype(float)
+                features = baseLearner.segmentFeatures(offsets-start, values)
+            else:
+                chunk = customers[i:i+chunkSize].tolist()
+                features = learner.getFeaturesBatch([train[c] for c in chunk])
+            nFeatures = features.shape[1]
+            features.astype("<f8").tofile(f)
+    customers.tofile(os.path.join(tmpPath, "customers.bin"))
+    with open(os.path.join(tmpPath, "meta.json"), "w") as f:
+        json.dump({"customers": len(customers), "features": nFeatures}, f)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmpPath, path)
+
+# Returns the FeatureCache of a train split, computing it if it is missing or stale.
+# Arguments
+#   train: the train split (see saveFeatures).
+#   trainPath: file (or store directory) the train split was loaded from. None uses
+#     sourcePath(train).
+#   cacheDir: directory holding the caches, in a directory per train file (and split
+#     of a split view). Stale caches of the same train file are removed.
+def getFeatureCache(train, trainPath=None, cacheDir="featureCache"):
+    trainPath = trainPath or sourcePath(train)
+    source = os.path.abspath(trainPath) + splitDescription(train)
+    sourceDir = os.path.join(cacheDir, hashlib.sha1(source.encode()).hexdigest()[:16])
+    version = trainVersion(train, trainPath) + featureVersion()
+    key = hashlib.sha1(version.encode()).hexdigest()[:16]
+    path = os.path.join(sourceDir, key)
+    if not os.path.exists(path):
+        print("Computing features")
+        if os.path.exists(sourceDir):
+            shutil.rmtree(sourceDir)
+        os.makedirs(sourceDir)
+        saveFeatures(train, path)
+        print("Done Computing")
+    return FeatureCache(path)
+
+# Makes every feature based learner use the cached features of a train split.
+# Same arguments as getFeatureCache.
+def useFeatureCache(train, trainPath=None, cacheDir="featureCache"):
+    baseLearner.BaseLearner.featureCache = getFeatureCache(train, trainPath, cacheDir)
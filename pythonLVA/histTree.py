@@ -0,0 +1,137 @@
+#!/usr/bin/python
+"""
+Histogram binned regression tree, learned from a stream of data blocks.
+Every feature is cut into at most `bins` bins (at quantiles of a random sample of the
+rows), and splits are chosen from per bin sums of the targets, like
+sklearn's DecisionTreeRegressor with the thresholds restricted to the bin edges.
+The data is read depth+1 times: once for the sample, and once per level of the tree.
+Memory use does not depend on the number of rows, only on the block size.
+"""
+
+import numpy as np
+
+class HistogramTreeRegressor():
+    # Arguments
+    #   maxDepth: maximum depth of the tree.
+    #   minSamplesLeaf: minimum number of rows in a leaf.
+    #   bins: maximum number of bins per feature.
+    #   sampleSize: number of rows the bin edges are computed from.
+    #   seed: seed of the sample.
+    def __init__(self, maxDepth=6, minSamplesLeaf=100, bins=256, sampleSize=200000, seed=0):
+        self.maxDepth = maxDepth
+        self.minSamplesLeaf = minSamplesLeaf
+        self.bins = bins
+        self.sampleSize = sampleSize
+        self.seed = seed
+
+    # Arguments
+    #   blocks: function without arguments, that returns a new iterator of (X, y)
+    #     blocks every time it is called. X is an array of shape (rows, features).
+    def fit(self, blocks):
+        # Random sample of the rows: the sampleSize rows with the smallest random keys
+        rng = np.random.default_rng(self.seed)
+        sample = None
+        keys = np.zeros(0)
+        count = 0
+        total = 0.
+        for X,y in blocks():
+            X = np.asarray(X, dtype=float)
+            count += len(y)
+            total += np.sum(y)
+            sample = X if sample is None else np.concatenate([sample, X])
+            keys = np.concatenate([keys, rng.random(len(X))])
+            if len(keys) > self.sampleSize:
+                keep = np.argpartition(keys, self.sampleSize)[:self.sampleSize]
+                sample = sample[keep]
+                keys = keys[keep]
+        if count == 0:
+            raise ValueError("no data to learn from")
+
+        # A row is in bin b of feature f if edges[f][b-1] <= x < edges[f][b]
+        quantiles = np.linspace(0, 1, self.bins+1)[1:-1]
+        self.edges = [np.unique(np.quantile(column, quantiles)) for column in sample.T]
+        nFeatures = len(self.edges)
+        nBins = max(len(e) for e in self.edges)+1
+
+        # Nodes of the tree. Leaves have feature -1.
+        self.feature = np.array([-1])
+        self.threshold = np.array([0.])
+        self.left = np.array([-1])
+        self.right = np.array([-1])
+        self.value = np.array([total/count])
+
+        frontier = np.array([0])
+        for depth in range(self.maxDepth):
+            # Position of every node in the frontier, or -1
+            position = np.full(len(self.feature), -1)
+            position[frontier] = np.arange(len(frontier))
+            size = len(frontier)*nFeatures*nBins
+            counts = np.zeros(size)
+            sums = np.zeros(size)
+            for X,y in blocks():
+                X = np.asarray(X, dtype=float)
+                rows = position[self.apply(X)]
+                inFrontier = rows >= 0
+                X = X[inFrontier]
+                y = np.asarray(y, dtype=float)[inFrontier]
+                base = rows[inFrontier]*nFeatures*nBins
+                for f,edges in enumerate(self.edges):
+                    index = base + f*nBins + np.searchsorted(edges, X[:,f], side="right")
+                    counts += np.bincount(index, minlength=size)
+                    sums += np.bincount(index, weights=y, minlength=size)
+            counts = counts.reshape(len(frontier), nFeatures, nBins)
+            sums = sums.reshape(len(frontier), nFeatures, nBins)
+
+            # Left side of a split at bin b: bins 0..b
+            leftCounts = np.cumsum(counts, axis=2)[:,:,:-1]
+            leftSums = np.cumsum(sums, axis=2)[:,:,:-1]
+            nodeCounts = counts[:,:1].sum(axis=2)
+            nodeSums = sums[:,:1].sum(axis=2)
+            rightCounts = nodeCounts[:,:,None]-leftCounts
+            rightSums = nodeSums[:,:,None]-leftSums
+            valid = (leftCounts >= self.minSamplesLeaf) & (rightCounts >= self.minSamplesLeaf)
+            for f,edges in enumerate(self.edges):
+                valid[:,f,len(edges):] = False
+            with np.errstate(divide="ignore", invalid="ignore"):
+                # Decrease of the squared error (up to the constant of the node)
+                gain = leftSums**2/leftCounts + rightSums**2/rightCounts - (nodeSums**2/nodeCounts)[:,:,None]
+            gain = np.where(valid, gain, -np.inf)
+
+            children = []
+            for i,node in enumerate(frontier):
+                f,b = np.unravel_index(np.argmax(gain[i]), gain[i].shape)
+                if not gain[i,f,b] > 0:
+                    continue
+                leftNode = len(self.feature)
+                self.feature = np.append(self.feature, [-1, -1])
+                self.threshold = np.append(self.threshold, [0., 0.])
+                self.left = np.append(self.left, [-1, -1])
+                self.right = np.append(self.right, [-1, -1])
+                self.value = np.append(self.value, [
+                    leftSums[i,f,b]/leftCounts[i,f,b],
+                    rightSums[i,f,b]/rightCounts[i,f,b]])
+                self.feature[node] = f
+                self.threshold[node] = self.edges[f][b]
+                self.left[node] = leftNode
+                self.right[node] = leftNode+1
+                children += [leftNode, leftNode+1]
+            if not children:
+                break
+            frontier = np.array(children)
+        return self
+
+    # Returns the leaf every row of X ends up in
+    def apply(self, X):
+        X = np.asarray(X, dtype=float)
+        node = np.zeros(len(X), dtype=int)
+        rows = np.arange(len(X))
+        while True:
+            inner = self.feature[node] >= 0
+            if not inner.any():
+                return node
+            f = np.maximum(self.feature[node], 0)
+            goLeft = X[rows, f] < self.threshold[node]
+            node = np.where(inner, np.where(goLeft, self.left[node], self.right[node]), node)
+
+    def predict(self, X):
+        return self.value[self.apply(X)]
@@ -1,6 +1,7 @@
 from baseLearner import BaseLearner
 from sklearn import hmm
 import numpy as np
+import multiprocessing
 import time
 
 # This file contains a Hidden Markov Model learner
@@ -10,11 +11,23 @@ import time
 
 # Extension: actions have descriptions, how to add it to this model?
 
-def Learner():
-    return lambda: HMMLearner()
+# Predictions can be made in two ways (predictMode):
+#   "sample": sample intervals from the model, n = 1, 2, 3, ..., until they add up to
+#     more than the period. Slow for users with many actions.
+#   "expected": the number of steps whose expected intervals add up to at most the
+#     period, computed from the state distribution at every step and the means of
+#     the states. Deterministic, and fast.
+
+# Models are fitted in worker processes (one model per number of states) when
+# workers is not 1. None uses every core.
+
+def Learner(predictMode="sample", workers=1):
+    return lambda: HMMLearner(predictMode, workers)
 
 class HMMLearner(BaseLearner):
-    def __init__(self):
+    def __init__(self, predictMode="sample", workers=1):
+        self.predictMode = predictMode
+        self.workers = workers
         self.name = "HMM"
 
     def learn(self,data):
@@ -24,14 +37,31 @@ class HMMLearner(BaseLearner):
     def predict(self, user, period):
         userID,timeStamps = user
         data = self.inputParser(timeStamps)
-        originalStart = self.model.startprob_
-        self.model.startprob_ = self.model.predict_proba(data)[-1]
+        return self.predictCount(self.model, self.model.predict_proba(data)[-1], period)
+
+    # Same as predict, with the state distributions of all users computed at once.
+    def predictBatch(self, users, periods):
+        offsets,values = intervalsBatch([actions for _,actions in users])
+        _,posteriors = forwardBatch(self.model, offsets, values)
+        return np.array([self.predictCount(self.model, p, period) for p,period in zip(posteriors, periods)], dtype=float)
+
+    # Predicts the number of actions in period.
+    # Arguments
+    #   model: GaussianHMM to predict with.
+    #   startprob: distribution of the state the user is in.
+    #   period: time period, in seconds.
+    def predictCount(self, model, startprob, period):
+        if self.predictMode == "expected":
+            return expectedCount(startprob, model.transmat_, model.means_[:,0], period)
+
+        originalStart = model.startprob_
+        model.startprob_ = startprob
 
         n = 1
-        while sum(self.model.sample(n)[0]) <= period:
+        while sum(model.sample(n)[0]) <= period:
             n = n+1
         predicted = n-1
-        self.model.startprob_ = originalStart
+        model.startprob_ = originalStart
         
         return predicted
 
@@ -41,20 +71,17 @@ class HMMLearner(BaseLearner):
     # the score.
     # It simply iterates on the number of states.
     def getModel(self,data, timeout=600):
+        if self.workers != 1:
+            return self.getModels([data], timeout)[0]
         start = time.time()
         prevModel = None
         prevScore = float("-inf")
         n = 1
         while time.time()-start < timeout and n < 7:
-            # Start with a fair start prob/transition matrix
-            startprob = np.array([1./n for i in range(n)])
-            transmat = np.array(np.array([startprob for i in range(n)]))
-            model = hmm.GaussianHMM(n, "full", startprob, transmat, n_iter=100)
-            try:
-                model.fit(data)
-                score = sum([1./len(data)*model.score(d) for d in data])
-            except:
+            fit = fitModel(n, data)
+            if fit is None:
                 return prevModel
+            model,score = fit
             print(n,score)
             if score < prevScore: # Local maxima found
                 return prevModel
@@ -63,3 +90,174 @@ class HMMLearner(BaseLearner):
                 prevScore = score
             n = n+1
         return prevModel
+
+    # Same as getModel, on several data sets (one model per data set).
+    # With workers, all the fits (every data set, every number of states) are
+    # scheduled on the same pool, so that every core stays busy. They all run at once
+    # instead of stopping at the first local maxima. Like in getModel, the model with
+    # one state is always fitted, and models with more states are only considered if
+    # they are fitted before the timeout.
+    def getModels(self, groups, timeout=600):
+        if self.workers == 1:
+            return [self.getModel(data, timeout) for data in groups]
+        deadline = time.time()+timeout
+        pool = multiprocessing.Pool(self.workers)
+        try:
+            # Fewer states first, in the order getModel would fit them
+            jobs = {}
+            for n in range(1,7):
+                for i,data in enumerate(groups):
+                    jobs[i,n] = pool.apply_async(fitModel, (n, data))
+            pool.close()
+
+            models = []
+            for i in range(len(groups)):
+                fits = []
+                for n in range(1,7):
+                    try:
+                        timeLeft = None if n == 1 else max(deadline-time.time(), 0)
+                        fits.append(jobs[i,n].get(timeLeft))
+                    except multiprocessing.TimeoutError:
+                        break
+                models.append(selectModel(fits))
+        finally:
+            # Also stops fits still running after the deadline
+            pool.terminate()
+            pool.join()
+        return models
+
+# Fits a GaussianHMM with n states. Runs in worker processes for getModels.
+# Arguments
+#   n: number of states.
+#   data: list of intervals between actions (see BaseLearner.inputParser).
+# Output
+#   (model, score) with the fitted model and its average score on data, or None if
+#   the model could not be fitted.
+def fitModel(n, data):
+    # Start with a fair start prob/transition matrix
+    startprob = np.array([1./n for i in range(n)])
+    transmat = np.array(np.array([startprob for i in range(n)]))
+    model = hmm.GaussianHMM(n, "full", startprob, transmat, n_iter=100)
+    try:
+        model.fit(data)
+        score = sum([1./len(data)*model.score(d) for d in data])
+    except Exception:
+        return None
+    return (model, score)
+
+# Picks a model out of the fits of 1, 2, 3, ... states (from fitModel), the way
+# getModel does: the last one before the score drops (a local maxima), or before a
+# fit fails.
+def selectModel(fits):
+    prevModel = None
+    prevScore = float("-inf")
+    for n,fit in enumerate(fits, 1):
+        if fit is None:
+            return prevModel
+        model,score = fit
+        print(n,score)
+        if score < prevScore: # Local maxima found
+            return prevModel
+        else:
+            prevModel = model
+            prevScore = score
+    return prevModel
+
+# Intervals between the actions of every user (BaseLearner.inputParser), in CSR
+# layout: the intervals of user i are values[offsets[i]:offsets[i+1]].
+# Arguments
+#   userActions: list of user actions, each a list of (timeStamp,rating,movieYear)
+def intervalsBatch(userActions):
+    lengths = np.array([len(u) for u in userActions], dtype=int)
+    timeStamps = np.array([a[0] for u in userActions for a in u], dtype=float)
+    users = np.repeat(np.arange(len(userActions)), lengths)
+    timeStamps = timeStamps[np.lexsort((timeStamps, users))]
+    # The first action of every user has no interval
+    first = np.zeros(len(timeStamps), dtype=bool)
+    first[(np.cumsum(lengths)-lengths)[lengths > 0]] = True
+    values = np.diff(timeStamps, prepend=0.)[~first]
+    offsets = np.concatenate([[0], np.cumsum(np.maximum(lengths-1, 0))])
+    return offsets, values
+
+def logSumExp(x, axis):
+    top = np.max(x, axis=axis, keepdims=True)
+    top = np.where(np.isfinite(top), top, 0.)
+    return np.log(np.sum(np.exp(x-top), axis=axis)) + np.squeeze(top, axis=axis)
+
+# Forward algorithm of a GaussianHMM with one dimensional observations, on many
+# sequences at once, in log space. The sequences are processed position by position,
+# longest first, so that every step only involves the sequences that are that long.
+# Arguments
+#   model: GaussianHMM.
+#   offsets, values: the sequences, in CSR layout (see intervalsBatch).
+# Output
+#   (scores, posteriors): for every sequence, its log likelihood (model.score(data)),
+#   and the distribution of its last state (model.predict_proba(data)[-1]).
+def forwardBatch(model, offsets, values):
+    n = len(model.startprob_)
+    means = np.reshape(model.means_, (n,-1))[:,0]
+    variances = np.reshape(model.covars_, (n,-1))[:,0]
+    with np.errstate(divide="ignore"):
+        logStart = np.log(model.startprob_)
+        logTrans = np.log(model.transmat_)
+    # Log density of every observation in every state
+    logEmission = -0.5*(np.log(2*np.pi*variances) + (np.asarray(values)[:,None]-means)**2/variances)
+
+    lengths = np.diff(offsets)
+    order = np.argsort(-lengths, kind="stable")
+    starts = np.asarray(offsets)[:-1][order]
+    descending = -lengths[order]
+    alpha = np.tile(logStart, (len(lengths),1))
+    for t in range(lengths.max() if len(lengths) else 0):
+        # Sequences longer than t
+        active = np.searchsorted(descending, -t, side="left")
+        if t == 0:
+            alpha[:active] += logEmission[starts[:active]]
+        else:
+            alpha[:active] = logSumExp(alpha[:active,:,None]+logTrans, axis=1) + logEmission[starts[:active]+t]
+
+    scores = np.empty(len(lengths))
+    posteriors = np.empty((len(lengths), n))
+    scores[order] = logSumExp(alpha, axis=1)
+    posteriors[order] = np.exp(alpha-scores[order][:,None])
+    return scores, posteriors
+
+# Returns the stationary distribution of a transition matrix.
+def stationaryDistribution(transmat):
+    n = len(transmat)
+    # Solve p*transmat = p, with the probabilities adding up to 1
+    A = np.vstack([transmat.T-np.eye(n), np.ones(n)])
+    b = np.append(np.zeros(n), 1.)
+    return np.linalg.lstsq(A, b, rcond=None)[0]
+
+# Expected number of actions of an HMM in a period: the largest n such that the
+# expected intervals of the first n steps add up to at most period.
+# Arguments
+#   startprob: distribution of the first state.
+#   transmat: transition matrix.
+#   means: mean interval of every state.
+#   period: time period, in seconds.
+#   tol: once the state distribution is this close to the stationary one, the
+#     remaining steps all take the stationary mean interval.
+#   maxSteps: maximum number of steps taken one at a time.
+def expectedCount(startprob, transmat, means, period, tol=1e-9, maxSteps=1000):
+    stationary = stationaryDistribution(transmat)
+    p = np.asarray(startprob, dtype=float)
+    total = 0.
+    count = 0
+    for step in range(maxSteps):
+        if np.abs(p-stationary).sum() < tol:
+            break
+        interval = p.dot(means)
+        if total+interval > period:
+            return count
+        total += interval
+        count += 1
+        p = p.dot(transmat)
+
+    # From here on, every step takes the stationary mean interval
+    interval = stationary.dot(means)
+    if interval <= 0:
+        # Intervals do not add up to anything, there is no meaningful count
+        return count
+    return count + int((period-total)//interval)
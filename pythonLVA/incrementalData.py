@@ -0,0 +1,171 @@
+#!/usr/bin/python
+"""
+Incremental updates of the pickles of getData and getSplitData (pickleDataFile,
+pickleTrainFile, pickleTestFile), for when new rating files come in.
+The records parsed out of every data file are kept in stateDir, with a fingerprint of
+the file. An update only parses the files that are new or changed, takes the records
+of changed (and removed) files out of their customers, merges the new ones in, and
+splits only the customers that changed.
+Action lists are kept sorted, instead of in file order like in getData. The splits
+are the same as after a full rebuild, since splitFn sorts the actions anyway.
+Customers with fewer than 5 actions are kept in stateDir too, so that they are added
+once they have enough.
+Can be called from the command line.
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import pickle
+from collections import Counter
+from functools import partial
+import numpy as np
+import dataProcessing
+import parserNF
+from streamSplit import recordType, sortRecords, fileRecords
+
+# Returns (name, fingerprint) of a data file from dataProcessing.getDataSources. Files
+# are fingerprinted by size and modification time, archive members by their contents.
+def fingerprint(source):
+    if isinstance(source, tuple):
+        name,contents = source
+        return (os.path.basename(name), hashlib.sha1(contents).hexdigest())
+    stat = os.stat(source)
+    return (os.path.basename(source), "%d:%d" % (stat.st_size, stat.st_mtime_ns))
+
+# Parses a data file into records. Runs in worker processes.
+# Arguments
+#   job: (name, fingerprint, source), where source is from getDataSources.
+#   movieInfo: information about movies. Created by the parserNF.parseMovies function.
+def parseSource(job, movieInfo):
+    with dataProcessing.openDataFile(job[2]) as dataFile:
+        return fileRecords(dataFile, movieInfo)
+
+# Generator of (customerID, actions) of records sorted with sortRecords, where actions
+# is the sorted list of (timeStamp,rating,movieYear) of the customer.
+def groupRecords(records):
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(records["customerID"]))+1, [len(records)]))
+    for start,end in zip(bounds[:-1], bounds[1:]):
+        if end > start:
+            group = records[start:end]
+            actions = zip(group["timestamp"].tolist(), group["rating"].tolist(), group["movieYear"].tolist())
+            yield (int(group["customerID"][0]), list(actions))
+
+# Pickles obj into path+".tmp". Renamed into place by the caller, once every file of
+# the update is written.
+def dumpTemporary(obj, path):
+    with open(path+".tmp", "wb") as f:
+        p = pickle.Pickler(f)
+        p.fast = True
+        p.dump(obj)
+
+# Arguments
+#   stateDir: directory with the records and fingerprints of the data files. If it
+#     (or one of the pickles) is missing, every data file is parsed.
+#   workers: number of processes parsing data files. None uses every core.
+# Output
+#   (mapped, train, test), the data of getData and getSplitData, which load them from
+#   the updated pickles afterwards.
+def updateData(stateDir="ingestState", workers=1):
+    manifestPath = os.path.join(stateDir, "manifest.json")
+    smallPath = os.path.join(stateDir, "smallCustomers")
+    outputs = ["pickleDataFile", "pickleTrainFile", "pickleTestFile"]
+    if all(os.path.exists(p) for p in [manifestPath, smallPath]+outputs):
+        with open(manifestPath) as f:
+            manifest = json.load(f)
+        loaded = []
+        for path in outputs+[smallPath]:
+            with open(path, "rb") as f:
+                loaded.append(pickle.load(f))
+        mapped,train,test,small = loaded
+    else:
+        print("No incremental state, parsing every file")
+        os.makedirs(stateDir, exist_ok=True)
+        manifest = {"files": {}, "batches": 0}
+        mapped,train,test,small = {},{},{},{}
+    files = manifest["files"]
+
+    # Files that are new, or changed
+    seen = set()
+    def jobs():
+        for source in dataProcessing.getDataSources():
+            name,filePrint = fingerprint(source)
+            seen.add(name)
+            if name not in files or files[name][0] != filePrint:
+                yield (name, filePrint, source)
+    movieInfo = parserNF.parseMovies(dataProcessing.getMoviesPath())
+    newFiles = []
+    with dataProcessing.parallelMap(partial(parseSource, movieInfo=movieInfo), jobs(), workers) as parsed:
+        for (name,filePrint,_),records in parsed:
+            newFiles.append((name, filePrint, records))
+    removedFiles = [name for name in files if name not in seen]
+    if not newFiles and not removedFiles:
+        print("Data set is up to date")
+        return (mapped, train, test)
+
+    # Records to take out: the previous records of changed and removed files
+    stale = [files[name] for name,_,_ in newFiles if name in files] + [files[name] for name in removedFiles]
+    removed = [np.load(os.path.join(stateDir, batch), mmap_mode="r")[start:end] for _,batch,start,end in stale]
+    removed = dict(groupRecords(sortRecords(np.concatenate(removed or [np.zeros(0, dtype=recordType)]))))
+    added = dict(groupRecords(sortRecords(np.concatenate([r for _,_,r in newFiles] or [np.zeros(0, dtype=recordType)]))))
+
+    affected = set(removed) | set(added)
+    for customerID in affected:
+        actions = mapped.pop(customerID, None) or small.pop(customerID, [])
+        if customerID in removed:
+            drop = Counter(removed[customerID])
+            kept = []
+            for action in actions:
+                if drop[action] > 0:
+                    drop[action] -= 1
+                else:
+                    kept.append(action)
+            actions = kept
+        if customerID in added:
+            actions = list(heapq.merge(actions, added[customerID]))
+        train.pop(customerID, None)
+        test.pop(customerID, None)
+        if len(actions) >= 5:
+            mapped[customerID] = actions
+            trainActions, testResult, testDuration, valid = dataProcessing.splitFn(actions)
+            if valid:
+                train[customerID] = trainActions
+                test[customerID] = (testResult, testDuration)
+        elif actions:
+            small[customerID] = actions
+
+    # The records of the parsed files go in a new batch
+    batch = "batch%05d.npy" % manifest["batches"]
+    manifest["batches"] += 1
+    np.save(os.path.join(stateDir, batch), np.concatenate([r for _,_,r in newFiles] or [np.zeros(0, dtype=recordType)]))
+    start = 0
+    for name,filePrint,records in newFiles:
+        files[name] = [filePrint, batch, start, start+len(records)]
+        start += len(records)
+    for name in removedFiles:
+        del files[name]
+
+    for obj,path in zip([mapped, train, test, small], outputs+[smallPath]):
+        dumpTemporary(obj, path)
+    with open(manifestPath+".tmp", "w") as f:
+        json.dump(manifest, f)
+    for path in outputs+[smallPath, manifestPath]:
+        os.replace(path+".tmp", path)
+
+    # Batches without records of current files
+    referenced = set(entry[1] for entry in files.values())
+    for f in os.listdir(stateDir):
+        if f.startswith("batch") and f not in referenced:
+            os.remove(os.path.join(stateDir, f))
+    print("Parsed %d files, removed %d files, updated %d customers" % (len(newFiles), len(removedFiles), len(affected)))
+    return (mapped, train, test)
+
+# Called from the command line
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the NetFlix pickles with new or changed data files")
+    parser.add_argument("--state", default="ingestState", help="directory of the incremental state")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes (0 uses every core)")
+    args = parser.parse_args()
+    updateData(args.state, args.workers or None)
@@ -0,0 +1,45 @@
+#!/usr/bin/python
+"""
+Registry of the learners, by the names they are picked with (on the command line of
+testMethod, for instance).
+Learner modules pull in large parts of sklearn, so they are only imported when a
+learner is picked.
+"""
+
+import importlib
+
+# Name -> learner module. Every module has a Learner() factory.
+registry = {
+    "simple": "simpleLearner",
+    "hmm": "hmmLearner",
+    "partitionHmm": "partitionHmmLearner",
+    "combination": "combinationLearner",
+    "linReg": "linReg",
+    "decision": "decision",
+    "decisionReg": "decisionReg",
+}
+
+# Learners that learn from the features of BaseLearner (see featureCache)
+featureLearners = {"linReg", "decision", "decisionReg"}
+
+# Names learners can be picked with: registered names, and module names.
+def names():
+    return sorted(set(registry) | set(registry.values()))
+
+# Returns the name a learner is registered with. Module names are accepted too.
+def registeredName(name):
+    for registered,module in registry.items():
+        if name == module:
+            return registered
+    if name not in registry:
+        raise KeyError("unknown learner %s (known: %s)" % (name, ", ".join(registry)))
+    return name
+
+# Imports the module of a learner, picked by name (or module name).
+def getModule(name):
+    return importlib.import_module(registry[registeredName(name)])
+
+# Returns the factory of a learner, picked by name (or module name). Arguments are
+# passed to the Learner() function of its module.
+def getFactory(name, *args, **kwargs):
+    return getModule(name).Learner(*args, **kwargs)
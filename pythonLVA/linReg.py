@@ -13,17 +13,58 @@ class LinearRegressionLearner(BaseLearner):
         self.name = "LinearRegressionLearner"
 
     def learn(self, data):
-        _,train,result = zip(*data)
-        X = [self.getFeatures(u) for u in train]
+        IDs,train,result = zip(*data)
+        X = self.getFeatureMatrix(IDs, train)
         y = [[number/duration] for number,duration in result]
         
         self.model = linear_model.LinearRegression()
         self.model.fit(X,y)
 
+    # Same least squares fit as learn, from the means and co-moments of the blocks,
+    # merged one block at a time.
+    def learnChunks(self, blocks):
+        n = 0
+        for X,y in blocks():
+            X = np.asarray(X, dtype=float)
+            y = np.asarray(y, dtype=float)
+            meanX = X.mean(axis=0)
+            meanY = y.mean()
+            Xc = X-meanX
+            if n == 0:
+                mx,my = meanX,meanY
+                Cxx = Xc.T @ Xc
+                Cxy = Xc.T @ (y-meanY)
+            else:
+                dx = meanX-mx
+                dy = meanY-my
+                w = n*len(y)/(n+len(y))
+                Cxx += Xc.T @ Xc + np.outer(dx,dx)*w
+                Cxy += Xc.T @ (y-meanY) + dx*dy*w
+                mx = mx + dx*len(y)/(n+len(y))
+                my = my + dy*len(y)/(n+len(y))
+            n += len(y)
+        if n == 0:
+            raise ValueError("no data to learn from")
+        # Solve on the correlation scale: the features range over many orders of magnitude
+        scale = np.sqrt(np.diag(Cxx))
+        scale[scale == 0] = 1.
+        coef = np.linalg.lstsq(Cxx/np.outer(scale,scale), Cxy/scale, rcond=None)[0]/scale
+
+        self.model = linear_model.LinearRegression()
+        self.model.coef_ = coef.reshape(1,-1)
+        self.model.intercept_ = np.array([my-mx@coef])
+
     def predict(self, user, period):
         ID,actions = user
-        rate = self.model.decision_function(self.getFeatures(actions))[0]
+        rate = self.model.decision_function(self.getFeatureMatrix([ID], [actions]))[0]
         return rate*period
 
+    # Same as predict, with a single model call for all users.
+    def predictBatch(self, users, periods):
+        IDs,actions = zip(*users)
+        X = self.getFeatureMatrix(IDs, actions)
+        rate = self.model.decision_function(X).ravel()
+        return rate*np.asarray(periods, dtype=float)
+
 def Learner():
     return lambda: LinearRegressionLearner()
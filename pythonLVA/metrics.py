@@ -0,0 +1,159 @@
+#!/usr/bin/python
+"""
+Stage level instrumentation for the LVA pipeline.
+Records, for every stage: number of calls, wall time, CPU time, items processed and
+the maximum RSS of the process so far when the stage ends (ru_maxrss, over the life of
+the process, not of the stage). Also records latency histograms.
+Everything is off by default, and then costs a function call per stage. Turn it on
+with enable(), or by setting the LVA_METRICS environment variable to the path of
+the file to export to when the process exits (Prometheus text format if it ends in
+.prom, JSON otherwise).
+Stages run in worker processes are recorded in those processes, not in the parent.
+Latency histograms: "predict:<learner>" has the latency of every prediction request
+of predictionServer, "predictBatch:<learner>" the latency of every predictBatch call
+of testMethod.getError (up to batchSize users each).
+
+Usage:
+  with metrics.stage("parseFile") as s:
+      ...
+      s.count(len(points))
+  metrics.observe("predict", seconds)
+"""
+
+import atexit
+import json
+import os
+import resource
+import time
+
+enabled = False
+
+# Stage name -> {"calls", "wallSeconds", "cpuSeconds", "items", "processMaxRSSBytes"}
+stages = {}
+
+# Histogram name -> {"buckets": counts per bucket in latencyBuckets, "sum", "count"}
+histograms = {}
+
+# Upper bounds (in seconds) of the latency histogram buckets
+latencyBuckets = [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60, float("inf")]
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def reset():
+    stages.clear()
+    histograms.clear()
+
+# Stage returned when metrics are off
+class _NoStage():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def count(self, items):
+        pass
+
+_noStage = _NoStage()
+
+class _Stage():
+    def __init__(self, name, items):
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    # Adds to the number of items processed by the stage
+    def count(self, items):
+        self.items += items
+
+    def __exit__(self, *exc):
+        record = stages.setdefault(self.name, {
+            "calls": 0,
+            "wallSeconds": 0.,
+            "cpuSeconds": 0.,
+            "items": 0,
+            "processMaxRSSBytes": 0,
+        })
+        record["calls"] += 1
+        record["wallSeconds"] += time.perf_counter()-self.wall
+        record["cpuSeconds"] += time.process_time()-self.cpu
+        record["items"] += self.items
+        # ru_maxrss is in kilobytes on linux
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024
+        record["processMaxRSSBytes"] = max(record["processMaxRSSBytes"], rss)
+        return False
+
+# Returns a context manager that records a stage.
+# Arguments
+#   name: name of the stage. Calls with the same name add up.
+#   items: number of items processed (more can be added with count).
+def stage(name, items=0):
+    if not enabled:
+        return _noStage
+    return _Stage(name, items)
+
+# Adds a value (in seconds) to a latency histogram
+def observe(name, seconds):
+    if not enabled:
+        return
+    histogram = histograms.get(name)
+    if histogram is None:
+        histogram = histograms[name] = {"buckets": [0]*len(latencyBuckets), "sum": 0., "count": 0}
+    for i,bound in enumerate(latencyBuckets):
+        if seconds <= bound:
+            histogram["buckets"][i] += 1
+            break
+    histogram["sum"] += seconds
+    histogram["count"] += 1
+
+def exportJSON(path):
+    with open(path, "w") as f:
+        json.dump({
+            "stages": stages,
+            "histograms": {name: dict(h, bounds=[str(b) for b in latencyBuckets]) for name,h in histograms.items()},
+        }, f, indent=2)
+
+def exportPrometheus(path):
+    label = lambda value: value.replace("\\", "\\\\").replace('"', '\\"')
+    lines = []
+    for metric,key,kind in [
+            ("lva_stage_calls_total", "calls", "counter"),
+            ("lva_stage_wall_seconds_total", "wallSeconds", "counter"),
+            ("lva_stage_cpu_seconds_total", "cpuSeconds", "counter"),
+            ("lva_stage_items_total", "items", "counter"),
+            ("lva_stage_process_max_rss_bytes", "processMaxRSSBytes", "gauge")]:
+        lines.append("# TYPE %s %s" % (metric, kind))
+        for name,record in stages.items():
+            lines.append('%s{stage="%s"} %s' % (metric, label(name), record[key]))
+    lines.append("# TYPE lva_latency_seconds histogram")
+    for name,histogram in histograms.items():
+        cumulative = 0
+        for bound,count in zip(latencyBuckets, histogram["buckets"]):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append('lva_latency_seconds_bucket{name="%s",le="%s"} %d' % (label(name), le, cumulative))
+        lines.append('lva_latency_seconds_sum{name="%s"} %s' % (label(name), histogram["sum"]))
+        lines.append('lva_latency_seconds_count{name="%s"} %d' % (label(name), histogram["count"]))
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+# Exports to Prometheus text if path ends in .prom, to JSON otherwise
+def export(path):
+    if path.endswith(".prom"):
+        exportPrometheus(path)
+    else:
+        exportJSON(path)
+
+if os.environ.get("LVA_METRICS"):
+    enable()
+    atexit.register(export, os.environ["LVA_METRICS"])
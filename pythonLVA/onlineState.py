@@ -0,0 +1,136 @@
+#!/usr/bin/python
+"""
+Running state of every customer, for predicting from a stream of rating events.
+Every event updates its customer's state in constant time: the number of actions,
+the first and last timestamps, the smallest and largest ratings and movie years,
+and Welford running means and variances of the timestamps, ratings, movie years and
+intervals between actions.
+SimpleLearner and the features of BaseLearner.getFeatures are computed from the
+state alone (see useOnlineState), so predicting does not get slower as histories
+grow. The features are the same as getFeatures, up to floating point rounding.
+The state of a customer is only used when the actions a learner is given are empty,
+or are the ones the state was built from (same number, first and last timestamp).
+Events of a customer must come in time order (equal timestamps are fine).
+"""
+
+import numpy as np
+import baseLearner
+import simpleLearner
+
+# State of one customer
+class CustomerState():
+    __slots__ = ["count", "means", "m2s", "minimums", "maximums", "gapMean", "gapM2"]
+
+    def __init__(self):
+        self.count = 0
+        # timeStamp, rating, movieYear
+        self.means = [0., 0., 0.]
+        self.m2s = [0., 0., 0.]
+        self.minimums = [None, None, None]
+        self.maximums = [None, None, None]
+        # Intervals between consecutive actions
+        self.gapMean = 0.
+        self.gapM2 = 0.
+
+    # Adds an action (timeStamp,rating,movieYear)
+    def add(self, action):
+        if self.count > 0:
+            if action[0] < self.maximums[0]:
+                raise ValueError("Events of a customer must come in time order")
+            gap = float(action[0])-self.maximums[0]
+            delta = gap-self.gapMean
+            self.gapMean += delta/self.count
+            self.gapM2 += delta*(gap-self.gapMean)
+        self.count += 1
+        for i,value in enumerate(action):
+            value = float(value)
+            delta = value-self.means[i]
+            self.means[i] += delta/self.count
+            self.m2s[i] += delta*(value-self.means[i])
+            if self.count == 1 or value < self.minimums[i]:
+                self.minimums[i] = value
+            if self.count == 1 or value > self.maximums[i]:
+                self.maximums[i] = value
+
+    # Cheap check that actions are the ones added so far, like in FeatureCache.lookup.
+    # Empty actions always match.
+    def matches(self, actions):
+        if not actions:
+            return True
+        timeStamps = [a[0] for a in actions]
+        return (len(actions), min(timeStamps), max(timeStamps)) == (self.count, self.minimums[0], self.maximums[0])
+
+    # Same as BaseLearner.getFeatures on the actions added so far
+    def features(self):
+        n = self.count
+        gaps = n-1
+        return np.array(
+            self.means
+            + [m2/n for m2 in self.m2s]
+            + [self.gapMean if gaps else np.nan, self.gapM2/gaps if gaps else np.nan]
+            + [n, self.minimums[0], self.maximums[0], self.minimums[2], self.maximums[2],
+               self.minimums[1], self.maximums[1]])
+
+class OnlineState():
+    def __init__(self):
+        self.customers = {}
+
+    # Adds a rating event of a customer, in constant time.
+    # Arguments
+    #   customerID: customer of the event.
+    #   action: (timeStamp,rating,movieYear)
+    def update(self, customerID, action):
+        state = self.customers.get(customerID)
+        if state is None:
+            state = self.customers[customerID] = CustomerState()
+        state.add(action)
+
+    # Adds the actions of every customer of a map from customerID to a list of actions
+    # (like the data of getData, or the train data of getSplitData).
+    def updateAll(self, mapped):
+        for customerID,actions in mapped.items():
+            for action in sorted(actions):
+                self.update(customerID, action)
+
+    def __contains__(self, customerID):
+        return customerID in self.customers
+
+    def __len__(self):
+        return len(self.customers)
+
+    # Arguments
+    #   customerIDs: list of customers.
+    #   userActions: their actions (see CustomerState.matches), or None.
+    # Output
+    #   (rows, found): the features of the customers, and a boolean array with False
+    #   for customers without state, with fewer than 2 actions (whose intervals are
+    #   undefined), or whose actions do not match (their rows are garbage), like
+    #   FeatureCache.lookup.
+    def lookup(self, customerIDs, userActions=None):
+        rows = np.zeros((len(customerIDs), 15))
+        found = np.zeros(len(customerIDs), dtype=bool)
+        for i,customerID in enumerate(customerIDs):
+            state = self.customers.get(customerID)
+            if state is None or state.count < 2:
+                continue
+            if userActions is not None and not state.matches(userActions[i]):
+                continue
+            rows[i] = state.features()
+            found[i] = True
+        return (rows, found)
+
+    # Returns (count, first timeStamp, last timeStamp) of a customer, or None if it
+    # has no state, or its state does not match actions (see CustomerState.matches).
+    def summary(self, customerID, actions=None):
+        state = self.customers.get(customerID)
+        if state is None or state.count == 0 or not state.matches(actions):
+            return None
+        return (state.count, state.minimums[0], state.maximums[0])
+
+# Makes SimpleLearner, and every feature based learner, predict the customers that have
+# state from it (instead of from the actions they are given).
+# Arguments
+#   state: OnlineState, or None to stop using one.
+def useOnlineState(state):
+    baseLearner.BaseLearner.onlineState = state
+    simpleLearner.SimpleLearner.onlineState = state
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+"""
+Exact k-means clustering of one dimensional data.
+In one dimension, the clusters of an optimal k-means solution are contiguous ranges
+of the sorted values, so the best partition can be found with dynamic programming
+over the sorted values: D[m][j], the smallest sum of squared distances of the first
+j values in m clusters, is the minimum over i of D[m-1][i] plus the cost of the
+range i:j as one cluster. Range costs come from prefix sums in constant time, and the
+best i does not decrease with j, so every layer is solved by divide and conquer in
+O(n log n) (all the subproblems of a level of the recursion at once, with numpy).
+Unlike KMeans, the result is exact, and does not depend on a random initialization.
+"""
+
+import numpy as np
+
+# Arguments
+#   values: array of numbers.
+#   k: number of clusters. At most the number of distinct values are made.
+# Output
+#   list of the boundaries of the clusters in the sorted values: cluster m holds
+#   sorted values bounds[m]:bounds[m+1].
+def optimalPartition(values, k):
+    x = np.sort(np.asarray(values, dtype=float))
+    n = len(x)
+    k = min(k, len(np.unique(x)))
+    if k <= 1:
+        return [0, n]
+    # Centering the values keeps the prefix sums of squares accurate
+    x = x-x.mean()
+    sums = np.concatenate(([0.], np.cumsum(x)))
+    squares = np.concatenate(([0.], np.cumsum(x*x)))
+    # Sum of squared distances to the mean of the sorted values i:j, for i < j
+    def cost(i, j):
+        s = sums[j]-sums[i]
+        return np.maximum((squares[j]-squares[i]) - s*s/(j-i), 0.)
+
+    # previous[j]: D[m-1][j]. argmins[m][j]: the best i of D[m][j].
+    previous = np.full(n+1, np.inf)
+    previous[1:] = cost(np.zeros(n, dtype=np.int64), np.arange(1, n+1))
+    argmins = {}
+    for m in range(2, k+1):
+        if m == k:
+            # Only every value in k clusters is needed
+            i = np.arange(m-1, n)
+            argmins[m] = {n: int(i[np.argmin(previous[i]+cost(i, n))])}
+            break
+        current = np.full(n+1, np.inf)
+        best = np.zeros(n+1, dtype=np.int64)
+        # Subproblems: D[m][j] for j in [jLo, jHi], with the best i in [iLo, iHi]
+        jLo,jHi = np.array([m]),np.array([n])
+        iLo,iHi = np.array([m-1]),np.array([n-1])
+        while len(jLo):
+            mid = (jLo+jHi)//2
+            hi = np.minimum(iHi, mid-1)
+            counts = hi-iLo+1
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            task = np.repeat(np.arange(len(mid)), counts)
+            candidates = iLo[task] + np.arange(counts.sum())-starts[task]
+            totals = previous[candidates]+cost(candidates, mid[task])
+            minimums = np.minimum.reduceat(totals, starts)
+            # First candidate with the minimum, in every subproblem
+            hits = np.flatnonzero(totals == minimums[task])
+            _,first = np.unique(task[hits], return_index=True)
+            argmin = candidates[hits[first]]
+            current[mid] = minimums
+            best[mid] = argmin
+            left = jLo <= mid-1
+            right = mid+1 <= jHi
+            jLo,jHi,iLo,iHi = (np.concatenate((jLo[left], mid[right]+1)),
+                               np.concatenate((mid[left]-1, jHi[right])),
+                               np.concatenate((iLo[left], argmin[right])),
+                               np.concatenate((argmin[left], iHi[right])))
+        argmins[m] = best
+        previous = current
+
+    bounds = [n]
+    for m in range(k, 1, -1):
+        bounds.append(int(argmins[m][bounds[-1]]))
+    return [0] + bounds[::-1]
+
+# Exact replacement for sklearn's KMeans on one dimensional data.
+class OptimalClustering():
+    # Arguments
+    #   clusters: number of clusters.
+    def __init__(self, clusters):
+        self.clusters = clusters
+        self.centers = None
+
+    # Arguments
+    #   values: array of numbers (or of shape (n, 1), like the input of KMeans).
+    def fit(self, values):
+        x = np.sort(np.ravel(np.asarray(values, dtype=float)))
+        bounds = optimalPartition(x, self.clusters)
+        self.centers = np.array([x[a:b].mean() for a,b in zip(bounds[:-1], bounds[1:])])
+        return self
+
+    # Returns the cluster of every value: the one with the nearest center. Clusters are
+    # numbered in increasing order of their centers.
+    def predict(self, values):
+        midpoints = (self.centers[1:]+self.centers[:-1])/2
+        return np.searchsorted(midpoints, np.ravel(np.asarray(values, dtype=float)))
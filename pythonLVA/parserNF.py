@@ -6,6 +6,7 @@ Can be called from the command line.
 
 import code
 import argparse
+import numpy as np
 from dataPoints import NetflixDataPoint
 
 """
@@ -16,6 +17,8 @@ parseFiles - takes a list of paths to data files, and a movieInfo data structure
 parseFile - takes a file descriptor, and processes all its data points. It is
             actually a generator that iterates over the points. To be used by
             parseFiles
+parseFileArrays - takes a file descriptor, and parses the whole file at once into
+                  numpy arrays. Much faster than parseFile, for bulk processing.
 parserCMD - parses command line arguments, and puts user in a python shell with
             dataPoints
 """
@@ -105,6 +108,32 @@ def parseFile(dataFile,movieInfo):
         line = line[:-1]
         yield NetflixDataPoint(line, movieID, currentMovie)
 
+# Used by parseFileArrays to turn a data file into a flat list of integers
+dateSeparators = str.maketrans("-\n", ",,")
+
+# Parses a whole netflix data file at once, instead of one line at a time.
+# Arguments
+#  dataFile: file object for a netflix data file.
+# Requirements
+#  dataFile must be a valid netflix data file (see parseFile). Does not check for
+#  inconsistencies, or formatting.
+# Output
+#  (movieID, customerIDs, ratings, dayNumbers), where the last three are numpy int64
+#  arrays with one entry per line of the file, in file order. dayNumbers are the
+#  dates as a number of days since 1970-01-01.
+def parseFileArrays(dataFile):
+    # Expect first line to contain (ID):\n, and want to extract ID
+    movieID = int(dataFile.readline()[:-2])
+    # Every line is "CustomerID,Rating,YYYY-MM-DD", so after turning dashes and
+    # newlines into commas the file is a flat list of 5 integers per line.
+    text = dataFile.read().translate(dateSeparators).strip(",")
+    values = np.fromstring(text, dtype=np.int64, sep=",").reshape(-1,5)
+    customerIDs,ratings,years,months,days = values.T
+    # datetime64 arithmetic takes care of month lengths and leap years
+    dates = (years-1970).astype("datetime64[Y]").astype("datetime64[M]") + (months-1)
+    dayNumbers = (dates.astype("datetime64[D]") + (days-1)).astype(np.int64)
+    return (movieID, customerIDs, ratings, dayNumbers)
+
 # Function to be called in case this is called from the command line
 def parserCMD():
     # Parsing command line arguments and automating the help message
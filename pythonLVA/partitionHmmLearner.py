@@ -1,6 +1,6 @@
-from hmmLearner import HMMLearner
+from hmmLearner import HMMLearner, intervalsBatch, forwardBatch
 from sklearn import hmm
-from sklearn.cluster import KMeans
+from optimalClustering import OptimalClustering
 import numpy as np
 import time
 
@@ -11,11 +11,13 @@ import time
 
 # Extension: actions have descriptions, how to add it to this model?
 
-def Learner(clusters=2):
-    return lambda: PartitionHMMLearner(clusters)
+def Learner(clusters=2, predictMode="sample", workers=1):
+    return lambda: PartitionHMMLearner(clusters, predictMode, workers)
 
 class PartitionHMMLearner(HMMLearner):
-    def __init__(self, clusters = 2):
+    def __init__(self, clusters = 2, predictMode="sample", workers=1):
+        self.predictMode = predictMode
+        self.workers = workers
         self.clusters = clusters
         self.models = None
         self.name = "HMM+Cluster(%d)" % self.clusters
@@ -24,13 +26,14 @@ class PartitionHMMLearner(HMMLearner):
         _,train,result = zip(*data)
         y = [[number/duration] for number,duration in result]
         
-        k = KMeans(init='k-means++', n_clusters=self.clusters, n_init=40)
+        # Exact, and deterministic, clustering of the rates
+        k = OptimalClustering(self.clusters)
         k.fit(y)
 
-        groups = [[] for i in range(self.clusters)]
-        for u,y in zip(train,y):
-            groups[k.predict(y)[0]].append(self.inputParser(u))
-        self.models = [self.getModel(group) for group in groups]
+        groups = [[] for i in range(len(k.centers))]
+        for u,label in zip(train,k.predict(y)):
+            groups[label].append(self.inputParser(u))
+        self.models = self.getModels(groups)
 
     def predict(self, user, period):
         if self.models is None:
@@ -48,13 +51,17 @@ class PartitionHMMLearner(HMMLearner):
                 score = newScore
                 model = m
         
-        originalStart = model.startprob_
-        model.startprob_ = model.predict_proba(data)[-1]
-
-        n = 1
-        while sum(model.sample(n)[0]) <= period:
-            n = n+1
-        predicted = n-1
-        model.startprob_ = originalStart
-        
-        return predicted
+        return self.predictCount(model, model.predict_proba(data)[-1], period)
+
+    # Same as predict, with the models scored on all users at once.
+    def predictBatch(self, users, periods):
+        if self.models is None:
+            # Untrained: predict's None for every user
+            return np.full(len(users), np.nan)
+
+        offsets,values = intervalsBatch([actions for _,actions in users])
+        scores,posteriors = zip(*[forwardBatch(m, offsets, values) for m in self.models])
+        # First model with the best score, like predict
+        best = np.argmax(np.array(scores), axis=0)
+        return np.array([self.predictCount(self.models[b], posteriors[b][i], period)
+            for i,(b,period) in enumerate(zip(best, periods))], dtype=float)
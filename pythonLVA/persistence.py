@@ -0,0 +1,99 @@
+#!/usr/bin/python
+"""
+Saving and loading of trained learners.
+A saved learner is a directory with:
+learner.pkl - the learner, pickled without its numpy arrays (HMM start/transition
+              probabilities, means and covariances, tree nodes, regression
+              coefficients, ...).
+buffers.bin - the data of those arrays, one after the other.
+meta.json - where every array is in buffers.bin, and what learner was saved.
+Learners get save and load methods from Persistent.
+When loading, buffers.bin is memory mapped and the arrays point straight into it, so
+loading takes about as long as unpickling the small learner.pkl.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+import numpy as np
+
+# Arrays start at multiples of this, so that they are aligned in memory
+alignment = 64
+
+# Arguments
+#   learner: trained learner.
+#   path: directory to save it in. It is replaced if it exists.
+def saveLearner(learner, path):
+    buffers = []
+    data = pickle.dumps(learner, protocol=5, buffer_callback=buffers.append)
+    tmpPath = path + ".tmp"
+    if os.path.exists(tmpPath):
+        shutil.rmtree(tmpPath)
+    os.makedirs(tmpPath)
+    with open(os.path.join(tmpPath, "learner.pkl"), "wb") as f:
+        f.write(data)
+    layout = []
+    with open(os.path.join(tmpPath, "buffers.bin"), "wb") as f:
+        for b in buffers:
+            raw = b.raw()
+            f.write(b"\0" * (-f.tell() % alignment))
+            layout.append((f.tell(), raw.nbytes))
+            f.write(raw)
+    meta = {
+        "class": type(learner).__name__,
+        "name": learner.name,
+        "buffers": layout,
+    }
+    with open(os.path.join(tmpPath, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmpPath, path)
+
+# Loads a learner saved with saveLearner. Its arrays are read-only, and memory mapped.
+def loadLearner(path):
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    with open(os.path.join(path, "learner.pkl"), "rb") as f:
+        data = f.read()
+    buffers = []
+    if meta["buffers"]:
+        mapped = np.memmap(os.path.join(path, "buffers.bin"), dtype=np.uint8, mode="r")
+        buffers = [mapped[offset:offset+length] for offset,length in meta["buffers"]]
+    return pickle.loads(data, buffers=buffers)
+
+# save and load methods of the learners
+class Persistent():
+    # Saves the trained learner in the directory path.
+    def save(self, path):
+        saveLearner(self, path)
+
+    # Loads a learner saved with save. Its arrays are memory mapped.
+    @staticmethod
+    def load(path):
+        return loadLearner(path)
+
+# Constructor arguments that do not change what a learner learns
+runtimeParameters = {"self", "workers"}
+
+# Returns the configuration of a learner: the values of the arguments of its
+# constructor (not what it learned, nor runtimeParameters), and the configuration of
+# the learners it combines.
+def learnerParameters(learner):
+    names = inspect.signature(type(learner).__init__).parameters
+    parameters = {name: getattr(learner, name) for name in names if name not in runtimeParameters and hasattr(learner, name)}
+    if hasattr(learner, "learners"):
+        parameters["learners"] = [(type(l).__name__, learnerParameters(l)) for l in learner.learners]
+        parameters["alphas"] = list(learner.alphas)
+    return sorted(parameters.items())
+
+# Returns a key for the artifact of a learner trained on some customers. Learners
+# of the same class and configuration, trained on the same customers of the same data
+# (dataVersion, see featureCache.trainVersion), have the same key.
+def artifactKey(learner, customerIDs, dataVersion=""):
+    description = "%s|%s|%r|%s|%s" % (type(learner).__name__, learner.name, learnerParameters(learner),
+                                      dataVersion, sorted(customerIDs))
+    return hashlib.sha1(description.encode()).hexdigest()[:16]
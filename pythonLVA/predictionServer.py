@@ -0,0 +1,235 @@
+#!/usr/bin/python
+"""
+HTTP prediction service for a trained learner.
+The learner is loaded once. Concurrent requests are grouped into micro-batches, and
+every batch is answered with a single predictBatch call.
+Works with any learner with predictBatch (SimpleLearner, LinearRegressionLearner,
+the decision tree learners, ...). Only uses the standard library, and numpy.
+Can be called from the command line.
+
+Requests:
+  POST /predict with a JSON body
+    {"actions": [[timeStamp,rating,movieYear], ...], "period": seconds}
+    and optionally "customerID". Answers {"prediction": number of actions}.
+    With an online state, "actions" can be left out for customers with events.
+    Requests without actions (at least minActions of the learner, 1 by default), with
+    actions that are not numbers, or with a period that is not finite, are answered
+    with status 400.
+  POST /event with a JSON body {"customerID": ID, "action": [timeStamp,rating,movieYear]}
+    adds a rating event to the online state (see onlineState). Answers
+    {"count": number of actions of the customer}.
+  GET /stats answers request count, batch count, and latency percentiles (in
+    seconds) of the most recent requests.
+With metrics on, the latency of every prediction request, from the time it is queued
+to its result, is recorded in the "predict:" histogram of the learner (see metrics).
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import math
+import time
+import numpy as np
+import metrics
+from onlineState import OnlineState, useOnlineState
+from persistence import loadLearner
+
+class PredictionServer():
+    # Arguments
+    #   learner: trained learner.
+    #   maxBatch: maximum number of requests in a batch.
+    #   maxDelay: how long (in seconds) the first request of a batch waits for others.
+    #   window: number of recent requests the latency percentiles are computed on.
+    #   state: OnlineState that the learner predicts from, and that events are added
+    #     to. None disables events.
+    def __init__(self, learner, maxBatch=256, maxDelay=0.002, window=10000, state=None):
+        self.learner = learner
+        self.minActions = getattr(learner, "minActions", 1)
+        self.state = state
+        if state is not None:
+            useOnlineState(state)
+        self.maxBatch = maxBatch
+        self.maxDelay = maxDelay
+        self.latencies = collections.deque(maxlen=window)
+        self.requests = 0
+        self.batches = 0
+        self.queue = None
+
+    # Answers a prediction request once its batch is done
+    async def predict(self, user, period):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((user, period, future))
+        return await future
+
+    # Groups queued requests into batches, and predicts them
+    async def batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time()+self.maxDelay
+            while len(batch) < self.maxBatch:
+                timeLeft = deadline-loop.time()
+                if timeLeft <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeLeft))
+                except asyncio.TimeoutError:
+                    break
+            users,periods,futures = zip(*batch)
+            try:
+                predictions = self.learner.predictBatch(list(users), list(periods))
+            except Exception:
+                # Predicts the requests one by one, so that only the failing ones fail
+                for user,period,future in batch:
+                    if future.done():
+                        continue
+                    try:
+                        future.set_result(float(np.ravel(self.learner.predict(user, period))[0]))
+                    except Exception as e:
+                        future.set_exception(e)
+            else:
+                # Futures of cancelled requests are already done
+                for future,prediction in zip(futures, np.ravel(predictions).tolist()):
+                    if not future.done():
+                        future.set_result(prediction)
+            self.batches += 1
+
+    def stats(self):
+        latencies = np.array(self.latencies)
+        percentile = lambda p: float(np.percentile(latencies, p)) if len(latencies) else None
+        return {
+            "learner": self.learner.name,
+            "requests": self.requests,
+            "batches": self.batches,
+            "p50": percentile(50),
+            "p99": percentile(99),
+        }
+
+    # Arguments
+    #   method, path: from the request line.
+    #   body: request body.
+    # Output
+    #   (status, JSON serializable answer)
+    async def route(self, method, path, body):
+        if method == "GET" and path == "/stats":
+            return (200, self.stats())
+        if method == "POST" and path == "/event" and self.state is not None:
+            return self.event(body)
+        if method != "POST" or path != "/predict":
+            return (404, {"error": "not found"})
+        start = time.perf_counter()
+        try:
+            request = json.loads(body)
+            customerID = request.get("customerID", -1)
+            if "actions" in request:
+                actions = [(float(t), int(r), int(y)) for t,r,y in request["actions"]]
+                if not all(math.isfinite(a[0]) for a in actions):
+                    raise ValueError("timestamps must be finite")
+                count = len(actions)
+            else:
+                summary = self.state.summary(customerID) if self.state is not None else None
+                if summary is None:
+                    raise KeyError("actions")
+                actions = []
+                count = summary[0]
+            if count < self.minActions:
+                raise ValueError("%s needs at least %d actions" % (self.learner.name, self.minActions))
+            period = float(request["period"])
+            if not math.isfinite(period):
+                raise ValueError("period must be finite")
+            user = (customerID, actions)
+        except (ValueError, KeyError, TypeError) as e:
+            return (400, {"error": "bad request: %s" % e})
+        enqueued = time.perf_counter()
+        try:
+            prediction = await self.predict(user, period)
+        except Exception as e:
+            return (500, {"error": str(e)})
+        end = time.perf_counter()
+        metrics.observe("predict:"+self.learner.name, end-enqueued)
+        self.latencies.append(end-start)
+        self.requests += 1
+        return (200, {"prediction": prediction})
+
+    # Adds a rating event to the online state
+    def event(self, body):
+        try:
+            request = json.loads(body)
+            customerID = request["customerID"]
+            timeStamp,rating,movieYear = request["action"]
+            self.state.update(customerID, (float(timeStamp), int(rating), int(movieYear)))
+        except (ValueError, KeyError, TypeError) as e:
+            return (400, {"error": "bad request: %s" % e})
+        return (200, {"count": self.state.summary(customerID)[0]})
+
+    # Serves the requests of a connection (kept alive until the client closes it)
+    async def handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if not requestLine:
+                    break
+                method,path,_ = requestLine.decode("latin-1").split(" ", 2)
+                length = 0
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name,_,value = header.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                body = await reader.readexactly(length) if length else b""
+                status,answer = await self.route(method, path, body)
+                payload = json.dumps(answer).encode()
+                writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n"
+                             % (status, b"OK" if status == 200 else b"Error", len(payload)) + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Stopped by stop(). Ends normally, since asyncio logs connection tasks
+            # that end cancelled as errors.
+            pass
+        finally:
+            self.handlers.discard(task)
+            writer.close()
+
+    # Starts serving. Returns the asyncio server (to be closed by the caller).
+    async def start(self, host="127.0.0.1", port=8000):
+        self.queue = asyncio.Queue()
+        self.handlers = set()
+        self.batcherTask = asyncio.ensure_future(self.batcher())
+        return await asyncio.start_server(self.handle, host, port)
+
+    # Stops the batcher, and the connections still open
+    async def stop(self):
+        tasks = [self.batcherTask] + list(self.handlers)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def serve(learner, host, port, maxBatch, maxDelay, state=None):
+    server = PredictionServer(learner, maxBatch, maxDelay, state=state)
+    httpServer = await server.start(host, port)
+    print("Serving", learner.name, "on %s:%d" % (host, port))
+    try:
+        async with httpServer:
+            await httpServer.serve_forever()
+    finally:
+        await server.stop()
+
+# Called from the command line
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve predictions of a trained learner")
+    parser.add_argument("learner", help="directory of a saved learner (see persistence)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on")
+    parser.add_argument("--batch", type=int, default=256, help="maximum batch size")
+    parser.add_argument("--delay", type=float, default=0.002, help="maximum batching delay, in seconds")
+    parser.add_argument("--online", action="store_true", help="accept rating events, and predict from them")
+    args = parser.parse_args()
+    state = OnlineState() if args.online else None
+    asyncio.run(serve(loadLearner(args.learner), args.host, args.port, args.batch, args.delay, state))
@@ -10,8 +10,13 @@ import code
 import os
 import time
 import datetime
+import numpy as np
+import persistence
+
+class SimpleLearner(persistence.Persistent):
+    # Running state of customers (see onlineState.useOnlineState)
+    onlineState = None
 
-class SimpleLearner():
     def __init__(self):
         self.name = "SimpleLearner"
 
@@ -22,10 +27,35 @@ class SimpleLearner():
         # Some background here: data comes in timestamps, but these span days.
         # So we will add a whole day to the data to account for that.
         oneDay = 24*60*60 # 24h*60m*60s
-        data = sorted(user[1])
-        learnPeriod = data[-1][0]-data[0][0] + oneDay
-        nactions = len(data)
+        summary = self.summary(user)
+        if summary is None:
+            data = sorted(user[1])
+            summary = (len(data), data[0][0], data[-1][0])
+        nactions,first,last = summary
+        learnPeriod = last-first + oneDay
         rate = nactions/learnPeriod # #actions/s
         return (period-oneDay)*rate # #actions
 
+    # Same as predict, for many users at once (see BaseLearner.predictBatch).
+    def predictBatch(self, users, periods):
+        oneDay = 24*60*60 # 24h*60m*60s
+        summaries = []
+        for user in users:
+            summary = self.summary(user)
+            if summary is None:
+                timeStamps = [a[0] for a in user[1]]
+                summary = (len(timeStamps), min(timeStamps), max(timeStamps))
+            summaries.append(summary)
+        nactions,first,last = np.array(summaries, dtype=float).reshape(-1,3).T
+        rate = nactions/(last-first + oneDay) # #actions/s
+        return (np.asarray(periods, dtype=float)-oneDay)*rate # #actions
+
+    # Returns (number of actions, first timeStamp, last timeStamp) of a user from the
+    # online state, or None if the user is not in it (or its actions are not the ones
+    # of its state).
+    def summary(self, user):
+        if self.onlineState is None:
+            return None
+        return self.onlineState.summary(user[0], user[1])
+
 Learner = lambda: lambda: SimpleLearner()
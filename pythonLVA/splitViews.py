@@ -0,0 +1,121 @@
+#!/usr/bin/python
+"""
+Train/test splits as views over a single sorted action store
+(dataProcessing.getSortedStore), instead of copies of the actions.
+A split only keeps, for every valid customer, where its actions start, where its
+train actions end, and its test number and duration, so building one takes a single
+vectorized pass over the customers, and any number of splits (with different train
+fractions, or time cutoffs) share the same action data.
+The train and test views behave like the dictionaries of getSplitData, so they can
+be given to getLearner and getError. With fracTrain=0.5 they hold exactly the same
+data as getSplitData.
+"""
+
+import numpy as np
+import dataProcessing
+import dataStore
+
+# Same as splitFn
+oneDay = 24*60*60 # seconds
+
+# Timestamps of the given rows of an action store
+def timestampsAt(store, rows):
+    if store.firstDay is None:
+        return store.timestamps[rows]
+    return store.dayTable[store.days[rows]-store.firstDay]
+
+# Binary search of many sorted row ranges of a store at once.
+# Arguments
+#   store: sorted action store.
+#   lo, hi: arrays with the row ranges [lo, hi) to search in.
+#   times: timestamp to search for in every range (or one for all of them).
+# Output
+#   array with the first row of every range whose timestamp is not before its time
+#   (hi if there is none).
+def searchRows(store, lo, hi, times):
+    lo = np.array(lo, dtype=np.int64)
+    hi = np.array(hi, dtype=np.int64)
+    times = np.broadcast_to(np.asarray(times, dtype=float), lo.shape)
+    while True:
+        searching = np.flatnonzero(lo < hi)
+        if len(searching) == 0:
+            return lo
+        mid = (lo[searching]+hi[searching])//2
+        before = timestampsAt(store, mid) < times[searching]
+        lo[searching[before]] = mid[before]+1
+        hi[searching[~before]] = mid[~before]
+
+# Number of actions of every customer before cutoff
+def countBefore(store, cutoff):
+    offsets = np.asarray(store.offsets)
+    return searchRows(store, offsets[:-1], offsets[1:], cutoff)-offsets[:-1]
+
+# Split of a sorted action store.
+class SplitView():
+    # Arguments
+    #   store: ActionStore with the actions of every customer sorted (see
+    #     dataStore.sortStore).
+    #   fracTrain: fraction of the actions of a customer in the train split, like in
+    #     splitFn (which keeps at least 5).
+    #   cutoff: if not None, the train split holds the actions before this timestamp
+    #     instead, and the test split the ones after it.
+    #   end: with cutoff, only the actions before this timestamp are in the test split.
+    # Customers are valid, like in splitFn, if they have 5 or more train actions, and
+    # at least one test action.
+    def __init__(self, store, fracTrain=0.5, cutoff=None, end=None):
+        self.store = store
+        self.fracTrain = fracTrain
+        self.cutoff = cutoff
+        self.end = end
+        offsets = np.asarray(store.offsets)
+        lengths = np.diff(offsets) if end is None else countBefore(store, end)
+        if cutoff is None:
+            endTrain = np.maximum((fracTrain*lengths).astype(np.int64), 5)
+        else:
+            endTrain = countBefore(store, cutoff)
+        valid = (np.minimum(endTrain, lengths) >= 5) & (lengths > endTrain)
+        self.customers = np.asarray(store.customers)[valid]
+        self.starts = offsets[:-1][valid]
+        self.ends = self.starts+endTrain[valid]
+        self.testNumbers = (lengths-endTrain)[valid]
+        # Note: these durations are accurate to within a day, so we add a day (see splitFn)
+        self.testDurations = oneDay+timestampsAt(store, self.ends)-timestampsAt(store, self.ends-1)
+        self.train = TrainView(self)
+        self.test = TestView(self)
+
+# Train split of a SplitView: map from customerID to the list of its train actions.
+# Shares index, __iter__, __len__ and __contains__ with the stores.
+class TrainView(dataStore.Store):
+    def __init__(self, split):
+        self.split = split
+        self.customers = split.customers
+
+    # Returns the (timestamps, ratings, movieYears) arrays of the train actions of a
+    # customer, like ActionStore.arrays.
+    def arrays(self, customerID):
+        i = self.index(customerID)
+        rows = slice(self.split.starts[i], self.split.ends[i])
+        store = self.split.store
+        return (timestampsAt(store, rows), store.ratings[rows], store.movieYears[rows])
+
+    def __getitem__(self, customerID):
+        return list(zip(*[column.tolist() for column in self.arrays(customerID)]))
+
+# Test split of a SplitView: map from customerID to (testNumber,testDuration).
+class TestView(dataStore.Store):
+    def __init__(self, split):
+        self.split = split
+        self.customers = split.customers
+
+    def __getitem__(self, customerID):
+        i = self.index(customerID)
+        return (int(self.split.testNumbers[i]), float(self.split.testDurations[i]))
+
+# Builds splits over the sorted store, one per train fraction and one per cutoff.
+# Output
+#   list of (train, test) views, the fractions first.
+def getSplitViews(fractions=(0.5,), cutoffs=(), compactDays=False):
+    store = dataProcessing.getSortedStore(compactDays)
+    splits = [SplitView(store, fracTrain=f) for f in fractions]
+    splits += [SplitView(store, cutoff=c) for c in cutoffs]
+    return [(s.train, s.test) for s in splits]
@@ -0,0 +1,173 @@
+#!/usr/bin/python
+"""
+Bounded memory version of dataProcessing.getSplitStore.
+getSplitData keeps the whole data set in memory (up to three copies of it). Here the
+raw data files are turned into sorted runs on disk, the runs are merged back one
+group of customers at a time (an external merge sort on customerID, timeStamp), and
+every customer goes through splitFn and straight into the train/test stores.
+Peak memory is bounded by memoryBudget (plus the actions of a single customer).
+"""
+
+import os
+import shutil
+import numpy as np
+import dataProcessing
+import dataStore
+import parserNF
+
+# One action on disk
+recordType = np.dtype([
+    ("customerID", "<i8"),
+    ("timestamp", "<f8"),
+    ("rating", "<i1"),
+    ("movieYear", "<i2"),
+])
+
+# Sorts records by (customerID,timeStamp,rating,movieYear), which is the order that
+# splitFn sorts actions in.
+def sortRecords(records):
+    order = np.lexsort((records["movieYear"], records["rating"], records["timestamp"], records["customerID"]))
+    return records[order]
+
+# Parses a whole data file into records, in file order.
+# Arguments
+#   dataFile: file object for a netflix data file.
+#   movieInfo: information about movies. Created by the parserNF.parseMovies function.
+def fileRecords(dataFile, movieInfo):
+    movieID,customerIDs,ratings,dayNumbers = parserNF.parseFileArrays(dataFile)
+    movieYear,movieTitle = movieInfo.get(movieID, None)
+    records = np.empty(len(customerIDs), dtype=recordType)
+    records["customerID"] = customerIDs
+    records["timestamp"] = dataProcessing.getTimeStamps(dayNumbers)
+    records["rating"] = ratings
+    records["movieYear"] = int(movieYear) if movieYear != 'NULL' else 1990
+    return records
+
+# Parses data files into sorted runs.
+# Arguments
+#   pathList: netflix data files (paths, or archive members, see
+#     dataProcessing.getDataSources).
+#   movieInfo: information about movies. Created by the parserNF.parseMovies function.
+#   runDir: directory to write the runs in.
+#   runBytes: size of the records kept in memory before sorting them into a run.
+# Output
+#   list of paths of the runs.
+def writeRuns(pathList, movieInfo, runDir, runBytes):
+    runPaths = []
+    buffered = []
+    size = 0
+    for i,path in enumerate(pathList):
+        with dataProcessing.openDataFile(path) as dataFile:
+            records = fileRecords(dataFile, movieInfo)
+        buffered.append(records)
+        size += records.nbytes
+        if size >= runBytes:
+            runPaths.append(os.path.join(runDir, "run%05d.bin" % len(runPaths)))
+            sortRecords(np.concatenate(buffered)).tofile(runPaths[-1])
+            buffered = []
+            size = 0
+        if (i+1)%100 == 0:
+            print("Processed", i+1, "files.")
+    if buffered:
+        runPaths.append(os.path.join(runDir, "run%05d.bin" % len(runPaths)))
+        sortRecords(np.concatenate(buffered)).tofile(runPaths[-1])
+    return runPaths
+
+# Reads a run one block at a time
+class RunReader():
+    def __init__(self, path, blockRecords):
+        self.file = open(path, "rb")
+        self.blockRecords = blockRecords
+        self.buffer = np.zeros(0, dtype=recordType)
+        self.exhausted = False
+        self.fill()
+
+    # Reads the next block of the run into the buffer
+    def fill(self):
+        block = np.fromfile(self.file, dtype=recordType, count=self.blockRecords)
+        if len(block) == 0:
+            self.exhausted = True
+            self.file.close()
+        else:
+            self.buffer = np.concatenate((self.buffer, block))
+
+    # Removes, and returns, the buffered records of customers before frontier
+    def take(self, frontier):
+        cut = np.searchsorted(self.buffer["customerID"], frontier)
+        taken = self.buffer[:cut]
+        self.buffer = self.buffer[cut:]
+        return taken
+
+# Merges sorted runs.
+# Arguments
+#   runPaths: list of paths of runs, from writeRuns.
+#   blockRecords: number of records read from a run at a time.
+# Output
+#   generator of (customerID, records), in increasing customerID order, where records
+#   holds every action of the customer, sorted.
+def mergeRuns(runPaths, blockRecords):
+    readers = [RunReader(path, blockRecords) for path in runPaths]
+    while True:
+        for r in readers:
+            if len(r.buffer) == 0 and not r.exhausted:
+                r.fill()
+        active = [r for r in readers if not r.exhausted]
+        # Customers before the frontier have all their records buffered already
+        if active:
+            frontier = min(r.buffer["customerID"][-1] for r in active)
+        else:
+            frontier = np.iinfo(np.int64).max
+        records = np.concatenate([r.take(frontier) for r in readers])
+        if len(records) == 0:
+            if not active:
+                return
+            # A single customer fills the buffers, read more of it
+            for r in active:
+                if r.buffer["customerID"][-1] == frontier:
+                    r.fill()
+            continue
+        records = sortRecords(records)
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(records["customerID"]))+1, [len(records)]))
+        for start,end in zip(bounds[:-1], bounds[1:]):
+            yield (int(records["customerID"][start]), records[start:end])
+
+# Arguments
+#   memoryBudget: approximate number of bytes of data held in memory at once.
+#   runDir: directory for the temporary runs. Removed when done.
+#   trainPath, testPath: where to save the train and test stores.
+#   compactDays: store train timestamps as day numbers (see dataStore).
+# Output
+#   (train, test) stores, same as dataProcessing.getSplitStore.
+def streamSplitData(memoryBudget=1<<30, runDir="runs", trainPath="trainStore", testPath="testStore", compactDays=False):
+    print("Splitting NetFlix dataset")
+    movieInfo = parserNF.parseMovies(dataProcessing.getMoviesPath())
+    if os.path.exists(runDir):
+        shutil.rmtree(runDir)
+    os.makedirs(runDir)
+
+    # Sorting a run takes about three times its size
+    runPaths = writeRuns(dataProcessing.getDataSources(), movieInfo, runDir, memoryBudget//3)
+    # Merging holds about two blocks per run
+    blockRecords = max(memoryBudget//(2*max(len(runPaths),1)*recordType.itemsize), 1024)
+
+    train = dataStore.StoreWriter(trainPath, dataStore.actionColumns, True, compactDays=compactDays)
+    test = dataStore.StoreWriter(testPath, dataStore.resultColumns, False)
+    for customerID,records in mergeRuns(runPaths, blockRecords):
+        if len(records) < 5:
+            continue
+        actions = list(zip(records["timestamp"].tolist(), records["rating"].tolist(), records["movieYear"].tolist()))
+        trainActions, testResult, testDuration, valid = dataProcessing.splitFn(actions)
+        if valid:
+            train.add(customerID, trainActions)
+            test.add(customerID, (testResult, testDuration))
+    train.close()
+    test.close()
+    shutil.rmtree(runDir)
+    print("Done Splitting")
+    return (dataStore.ActionStore(trainPath), dataStore.ResultStore(testPath))
+
+# Called from the command line, with the memory budget in megabytes
+if __name__ == "__main__":
+    import sys
+    budget = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+    streamSplitData(budget<<20)
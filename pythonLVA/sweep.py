@@ -0,0 +1,113 @@
+#!/usr/bin/python
+"""
+Parallel version of testMethodIterative.
+Runs every (learner, nLearning, repeat) job of a sweep on a pool of processes, each
+with its own deterministic seed. The train/test data is loaded once, before the
+workers are forked, so the workers share it instead of getting copies.
+Results are appended to a CSV file as jobs finish. Jobs that already have results in
+that file are skipped, so an interrupted sweep can be resumed by running it again.
+Can be called from the command line.
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import random
+import zlib
+import numpy as np
+import learners
+from dataProcessing import getSplitData, getSplitStore
+from testMethod import getLearner, getError, predictError
+
+# Columns of the results file. The first ones are the columns testMethod prints.
+columns = ["name", "nLearning", "nTesting"] + [f.__name__ for f in predictError] + ["learner", "repeat", "seed"]
+
+# Train/test data, shared with the forked workers
+sharedData = None
+
+# Seed of a job, which only depends on the job (not on the order jobs run in).
+def jobSeed(learner, nLearning, repeat, seed):
+    return zlib.crc32(("%s|%d|%d|%d" % (learner, nLearning, repeat, seed)).encode())
+
+# Runs a job in a worker.
+# Arguments
+#   job: (learner, nLearning, nTesting, repeat, seed), where learner is the name of a
+#     learner (see learners.registry).
+# Output
+#   (job, row of the results file), or (job, None) if the job failed.
+def runJob(job):
+    learner, nLearning, nTesting, repeat, seed = job
+    train,test = sharedData
+    rng = random.Random(seed)
+    np.random.seed(seed)
+    try:
+        Learner = learners.getFactory(learner)
+        trained = getLearner(train,test,nLearning,Learner,rng)
+        error = getError(train,test,trained,nTesting,rng)
+    except Exception as e:
+        print("Error occurred in", job, str(e))
+        return (job, None)
+    return (job, [trained.name, nLearning, nTesting] + list(error) + [learner, repeat, seed])
+
+# Returns the set of (learner, nLearning, repeat, seed) with results in path
+def finishedJobs(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return set((r["learner"], int(r["nLearning"]), int(r["repeat"]), int(r["seed"])) for r in csv.DictReader(f))
+
+# Arguments
+#   learners: names of learners (see learners.registry).
+#   nLearners: numbers of learning samples.
+#   repeats: number of runs for each learner and number of learning samples.
+#   nTesting: number of testing samples.
+#   seed: base seed of the sweep.
+#   workers: number of processes. None uses every core.
+#   output: path of the CSV results file.
+#   stores: load the data with getSplitStore instead of getSplitData.
+def runSweep(learners, nLearners, repeats=5, nTesting=20000, seed=0, workers=None, output="sweep.csv", stores=False):
+    global sharedData
+    done = finishedJobs(output)
+    jobs = []
+    for learner in learners:
+        for nLearning in nLearners:
+            for repeat in range(repeats):
+                s = jobSeed(learner, nLearning, repeat, seed)
+                if (learner, nLearning, repeat, s) not in done:
+                    jobs.append((learner, nLearning, nTesting, repeat, s))
+    print("%d jobs to run, %d already done." % (len(jobs), len(done)))
+    if not jobs:
+        return
+
+    sharedData = getSplitStore() if stores else getSplitData()
+    print("Data acquisition complete.")
+
+    newFile = not os.path.exists(output)
+    with open(output, "a", newline="") as f:
+        writer = csv.writer(f)
+        if newFile:
+            writer.writerow(columns)
+        # Forked workers inherit sharedData
+        with multiprocessing.get_context("fork").Pool(workers) as pool:
+            for job,row in pool.imap_unordered(runJob, jobs):
+                if row is not None:
+                    print("\t".join(str(i) for i in row[:len(columns)-3]))
+                    writer.writerow(row)
+                    f.flush()
+
+# Called from the command line. The defaults are the sweep of testMethodIterative.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a sweep of LVA experiments in parallel")
+    parser.add_argument("--learners", nargs="+", default=["partitionHmmLearner"], help="learners (see learners.registry)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[500,1000,1500,2000,2500,3000],
+                        help="numbers of learning samples")
+    parser.add_argument("--repeats", type=int, default=5, help="runs per learner and size")
+    parser.add_argument("--testing", type=int, default=20000, help="number of testing samples")
+    parser.add_argument("--seed", type=int, default=0, help="base seed of the sweep")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes")
+    parser.add_argument("--output", default="sweep.csv", help="CSV results file")
+    parser.add_argument("--stores", action="store_true", help="use the memory mapped data stores")
+    args = parser.parse_args()
+    runSweep(args.learners, args.sizes, args.repeats, args.testing, args.seed, args.workers,
+             args.output, args.stores)
@@ -0,0 +1,72 @@
+#!/usr/bin/python
+"""
+Generates a synthetic data set in the netflix format, to test and benchmark the
+pipeline without the real data set.
+Can be called from the command line.
+"""
+
+import argparse
+import os
+import numpy as np
+
+# Writes a synthetic netflix data set: directory/movie_titles.txt, and one
+# directory/training_set/mv_XXXXXXX.txt file per movie, in the format described in
+# parserNF.
+# Arguments
+#   directory: where to write the data set.
+#   nUsers: number of customers.
+#   nMovies: number of movies.
+#   ratingsPerUser: average number of ratings of a customer.
+#   skew: how uneven activity is. Customer activity and movie popularity follow a
+#     power law with this exponent. 0 makes every customer (and movie) alike.
+#   seed: random seed. The same arguments always write the same files.
+# Output
+#   total number of ratings written.
+def generate(directory, nUsers=1000, nMovies=100, ratingsPerUser=50, skew=1.0, seed=0):
+    rng = np.random.default_rng(seed)
+    dataDir = os.path.join(directory, "training_set")
+    os.makedirs(dataDir, exist_ok=True)
+
+    # Customers have IDs with gaps, and are active for a part of the 1999-2005 period
+    customerIDs = np.sort(rng.choice(2649429, nUsers, replace=False)+1)
+    activity = rng.permutation(1./np.arange(1, nUsers+1)**skew)
+    activity /= activity.sum()
+    firstDay = np.datetime64("1999-11-11")
+    nDays = int((np.datetime64("2005-12-31")-firstDay).astype(np.int64))
+    userStart = rng.integers(0, nDays, nUsers)
+    userLength = (rng.random(nUsers)*(nDays-userStart)).astype(np.int64)+1
+
+    # Popular movies get more ratings. A customer rates a movie at most once.
+    popularity = 1./np.arange(1, nMovies+1)**skew
+    popularity = rng.permutation(popularity/popularity.sum())
+    counts = np.minimum(np.round(popularity*nUsers*ratingsPerUser).astype(np.int64), nUsers)
+    counts = np.maximum(counts, 1)
+
+    with open(os.path.join(directory, "movie_titles.txt"), "w", encoding="ISO-8859-1") as titles:
+        for movieID in range(1, nMovies+1):
+            year = "NULL" if rng.random() < 0.01 else str(rng.integers(1920, 2006))
+            titles.write("%d,%s,Synthetic Movie %d\n" % (movieID, year, movieID))
+
+    for movieID,count in zip(range(1, nMovies+1), counts.tolist()):
+        users = rng.choice(nUsers, count, replace=False, p=activity)
+        days = userStart[users] + (rng.random(count)*userLength[users]).astype(np.int64)
+        dates = np.datetime_as_string(firstDay+days, unit="D")
+        ratings = rng.choice(5, count, p=[0.05,0.1,0.3,0.35,0.2])+1
+        lines = ["%d,%d,%s\n" % line for line in zip(customerIDs[users].tolist(), ratings.tolist(), dates.tolist())]
+        with open(os.path.join(dataDir, "mv_%07d.txt" % movieID), "w") as dataFile:
+            dataFile.write("%d:\n" % movieID)
+            dataFile.writelines(lines)
+    return int(counts.sum())
+
+# Called from the command line
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic netflix data set")
+    parser.add_argument("directory", help="where to write the data set")
+    parser.add_argument("--users", type=int, default=1000, help="number of customers")
+    parser.add_argument("--movies", type=int, default=100, help="number of movies")
+    parser.add_argument("--ratings", type=int, default=50, help="average ratings per customer")
+    parser.add_argument("--skew", type=float, default=1.0, help="power law exponent of activity")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+    total = generate(args.directory, args.users, args.movies, args.ratings, args.skew, args.seed)
+    print("Wrote", total, "ratings.")
@@ -11,15 +11,35 @@ It tests predictors with the following interface:
 """
 from dataProcessing import *
 import code
+import os
 import random
 import errorFns
+import featureCache
+import metrics
+import persistence
+import time
+import numpy as np
 
 inf = float("inf")
 
-def getLearner(train,test,nLearning,Learner):
-    trainIDs = random.sample(train.keys(), nLearning)
+# rng is the random number generator used to pick users (random.Random(seed) makes
+# runs reproducible).
+# With artifactDir, trained learners are saved there, and a learner with the same
+# configuration and training sample, of the same train data, is loaded instead of
+# trained again. trainPath is the file the train data was loaded from (see
+# featureCache.trainVersion).
+def getLearner(train,test,nLearning,Learner,rng=random,artifactDir=None,trainPath=None):
+    trainIDs = rng.sample(list(train.keys()), nLearning)
     learner = Learner()
-    learner.learn([(ID,train[ID],test[ID]) for ID in trainIDs])
+    if artifactDir is not None:
+        key = persistence.artifactKey(learner, trainIDs, featureCache.trainVersion(train, trainPath))
+        path = os.path.join(artifactDir, key)
+        if os.path.exists(path):
+            return persistence.loadLearner(path)
+    with metrics.stage("learn:"+learner.name, nLearning):
+        learner.learn([(ID,train[ID],test[ID]) for ID in trainIDs])
+    if artifactDir is not None:
+        learner.save(path)
     return learner
 
 # Prediction error calculation.
@@ -30,41 +50,74 @@ predictError = [
     errorFns.underError,
     errorFns.overError,
     ]
-def getError(train,test,learner,nTesting):
+# Predicts nTesting random test users.
+# Predictions are made batchSize users at a time. With metrics on, the latency of
+# every predictBatch call (of batchSize users) is recorded, as "predictBatch:" and
+# the name of the learner.
+# Output
+#   array of shape (len(predictError), nTesting), the errors of every prediction.
+def getErrors(train,test,learner,nTesting,rng=random,batchSize=1024):
+    sample = rng.sample(list(test.items()), nTesting)
+    users = [(customerID, train[customerID]) for customerID,_ in sample]
+    periods = [testDuration for _,(testNumber, testDuration) in sample]
+    predictions = []
+    with metrics.stage("predict:"+learner.name, nTesting):
+        for i in range(0, nTesting, batchSize):
+            start = time.perf_counter()
+            predictions.extend(learner.predictBatch(users[i:i+batchSize], periods[i:i+batchSize]))
+            metrics.observe("predictBatch:"+learner.name, time.perf_counter()-start)
+    predictions = np.array(predictions, dtype=float)
+    actuals = np.array([testNumber for _,(testNumber, testDuration) in sample], dtype=float)
+    return np.array([errorFns.vectorized[errorFn](predictions, actuals) for errorFn in predictError])
+
+def getError(train,test,learner,nTesting,rng=random,batchSize=1024):
     # Calculate average error
-    error = [0]*len(predictError)
-    for customerID,(testNumber, testDuration) in random.sample(test.items(), nTesting):
-        user = (customerID, train[customerID])
-        prediction = learner.predict(user, testDuration)
-        for i,errorFn in enumerate(predictError):
-            error[i] += errorFn(prediction, testNumber)/nTesting
-    return error
+    return getErrors(train,test,learner,nTesting,rng,batchSize).mean(axis=1).tolist()
+
+# Average error, with a bootstrap confidence interval of every error.
+# Output
+#   (error, lower, upper), lists with a value for every function of predictError.
+def getErrorInterval(train,test,learner,nTesting,rng=random,nBootstrap=1000,confidence=0.95):
+    errors = getErrors(train,test,learner,nTesting,rng)
+    lower,upper = errorFns.bootstrapInterval(errors, nBootstrap, confidence, rng.getrandbits(64))
+    return errors.mean(axis=1).tolist(), lower.tolist(), upper.tolist()
 
-import simpleLearner
-import hmmLearner
-import partitionHmmLearner
-import combinationLearner
-import linReg
-import decision
-import decisionReg
 # Calculate the average error
 if __name__ == "__main__":
-    # Parameters for learning, and testing, so that we don't take forever, every time
-    nLearning = 100000
-    nTesting = 20000
-    Learner = decisionReg.Learner()
+    import argparse
+    import learners
+    parser = argparse.ArgumentParser(description="Learn and test an LVA learner")
+    parser.add_argument("--learner", default="decisionReg", choices=learners.names(),
+                        help="learner to run")
+    # Defaults so that we don't take forever, every time
+    parser.add_argument("--learning", type=int, default=100000, help="number of learning samples")
+    parser.add_argument("--testing", type=int, default=20000, help="number of testing samples")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--artifacts", default=None, help="directory of saved trained learners")
+    parser.add_argument("--interact", action="store_true", help="open a console when done")
+    args = parser.parse_args()
+    nLearning = args.learning
+    nTesting = args.testing
+    rng = random.Random(args.seed)
+    if args.seed is not None:
+        np.random.seed(args.seed)
+    Learner = learners.getFactory(args.learner)
     
     train, test = getSplitData()
+    if learners.registeredName(args.learner) in learners.featureLearners:
+        featureCache.useFeatureCache(train)
     print("Data acquisition complete.")
     print("Run with %d learning samples, and %d testing samples." % (nLearning, nTesting))
 
-    learner = getLearner(train,test,nLearning,Learner)
+    learner = getLearner(train,test,nLearning,Learner,rng,args.artifacts)
 
     print("Learning is complete, testing")
 
-    error = getError(train,test,learner,nTesting)
+    error,lower,upper = getErrorInterval(train,test,learner,nTesting,rng)
     
     print("Average error:", error)
+    print("95% confidence intervals:", list(zip(lower, upper)))
     print("%s\t%d\t%d\t%s" % (learner.name, nLearning, nTesting, '\t'.join([str(i) for i in error])))
 
-    code.interact(local=locals())
+    if args.interact:
+        code.interact(local=locals())
@@ -11,11 +11,13 @@ It tests predictors with the following interface:
 """
 from dataProcessing import *
 from testMethod import *
+import learners
 
 # Calculate the average error
 if __name__ == "__main__":
     nLearners = [500,1000,1500,2000,2500,3000]
-    Learner = partitionHmmLearner.Learner()
+    nTesting = 20000
+    Learner = learners.getFactory("partitionHmm")
     
     train, test = getSplitData()
     print("Data acquisition complete, reading now.")
@@ -0,0 +1,37 @@
+"""
+Shared fixtures of the tests: a small synthetic data set (see syntheticNF), and the
+customer map of getData built from it.
+Run from the repository root with: python -m pytest pythonLVA/tests
+"""
+
+import os
+import sys
+import pytest
+
+# The modules of pythonLVA are imported by name, like the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dataProcessing
+import parserNF
+import syntheticNF
+
+@pytest.fixture(scope="session")
+def dataDir(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("download"))
+    syntheticNF.generate(directory, nUsers=300, nMovies=30, ratingsPerUser=30, skew=1.0, seed=0)
+    return directory
+
+# Paths of the data files of the synthetic data set
+@pytest.fixture(scope="session")
+def dataFiles(dataDir):
+    trainingSet = os.path.join(dataDir, "training_set")
+    return [os.path.join(trainingSet, f) for f in sorted(os.listdir(trainingSet))]
+
+@pytest.fixture(scope="session")
+def movieInfo(dataDir):
+    return parserNF.parseMovies(os.path.join(dataDir, "movie_titles.txt"))
+
+# Map from customerID to a list of (timeStamp,rating,movieYear), like getData
+@pytest.fixture(scope="session")
+def mapped(dataFiles, movieInfo):
+    return dataProcessing.mapFiles(dataFiles, movieInfo)
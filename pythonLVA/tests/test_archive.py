@@ -0,0 +1,38 @@
+"""
+The training set is parsed the same from its directory and from its archive, whatever
+the line endings of the files.
+"""
+
+import os
+import shutil
+import tarfile
+import pytest
+import dataProcessing
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_archive(dataDir, movieInfo, tmp_path, monkeypatch, bulk):
+    directory = os.path.join(tmp_path, "directory")
+    shutil.copytree(dataDir, directory)
+    # Windows line endings in one of the files
+    trainingSet = os.path.join(directory, "training_set")
+    crlf = os.path.join(trainingSet, sorted(os.listdir(trainingSet))[0])
+    with open(crlf, "rb") as f:
+        contents = f.read()
+    with open(crlf, "wb") as f:
+        f.write(contents.replace(b"\n", b"\r\n"))
+
+    archived = os.path.join(tmp_path, "archived")
+    os.makedirs(archived)
+    with tarfile.open(os.path.join(archived, "training_set.tar.gz"), "w:gz") as archive:
+        archive.add(trainingSet, "training_set")
+
+    monkeypatch.setattr(dataProcessing, "dataDirectory", directory)
+    fromDirectory = dataProcessing.mapFiles(dataProcessing.getDataSources(), movieInfo, bulk)
+    monkeypatch.setattr(dataProcessing, "dataDirectory", archived)
+    assert dataProcessing.getArchivePath() is not None
+    fromArchive = dataProcessing.mapFiles(dataProcessing.getDataSources(), movieInfo, bulk)
+    monkeypatch.setattr(dataProcessing, "dataDirectory", dataDir)
+    original = dataProcessing.mapFiles(dataProcessing.getDataSources(), movieInfo, bulk)
+    # Files are listed in different orders, so actions are compared sorted
+    actions = lambda mapped: {c: sorted(a) for c,a in mapped.items()}
+    assert actions(fromArchive) == actions(fromDirectory) == actions(original)
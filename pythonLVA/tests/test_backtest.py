@@ -0,0 +1,62 @@
+"""
+Backtests count the actual actions of every window [cutoff, cutoff+period) the same
+as counting them one by one, and so do TimestampIndex and splitViews.searchRows.
+"""
+
+import os
+import random
+import numpy as np
+import pytest
+import dataStore
+import simpleLearner
+from backtest import TimestampIndex, backtest
+from splitViews import searchRows, timestampsAt
+
+oneDay = 24*60*60
+
+@pytest.fixture(scope="module")
+def store(mapped, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("stores"))
+    dataStore.saveActions(mapped, os.path.join(path, "store"))
+    dataStore.sortStore(dataStore.ActionStore(os.path.join(path, "store")), os.path.join(path, "sorted"))
+    return dataStore.ActionStore(os.path.join(path, "sorted"))
+
+@pytest.fixture(scope="module")
+def cutoffs(store):
+    timestamps = np.asarray(store.timestamps)
+    return [float(t) for t in np.quantile(timestamps, [0.4, 0.6, 0.8])]
+
+def test_searchRows(store, cutoffs):
+    offsets = np.asarray(store.offsets)
+    for cutoff in cutoffs:
+        rows = searchRows(store, offsets[:-1], offsets[1:], cutoff)
+        for i in range(len(store.customers)):
+            timestamps = timestampsAt(store, slice(offsets[i], offsets[i+1]))
+            assert rows[i] == offsets[i]+np.searchsorted(timestamps, cutoff)
+
+def test_countBetween(mapped, store, cutoffs):
+    index = TimestampIndex(store)
+    customerIDs = sorted(mapped)
+    positions = index.positions(customerIDs)
+    for cutoff in cutoffs:
+        counts = index.countBetween(positions, cutoff, cutoff+30*oneDay)
+        expected = [sum(cutoff <= a[0] < cutoff+30*oneDay for a in mapped[c]) for c in customerIDs]
+        assert counts.tolist() == expected
+
+def test_backtestActual(mapped, store, cutoffs):
+    periods = [7*oneDay, 90*oneDay]
+    results = backtest(store, simpleLearner.Learner(), cutoffs, periods, nLearning=50,
+                       nTesting=len(mapped), rng=random.Random(0))
+    assert [(r["cutoff"], r["period"]) for r in results] == [(c, p) for c in cutoffs for p in periods]
+    for result in results:
+        cutoff = result["cutoff"]
+        # Customers predicted: 5 or more actions before the cutoff, and some after it
+        counts = []
+        for actions in mapped.values():
+            before = sum(a[0] < cutoff for a in actions)
+            if before >= 5 and before < len(actions):
+                counts.append(sum(cutoff <= a[0] < cutoff+result["period"] for a in actions))
+        assert len(counts) > 0
+        assert result["actions"] == sum(counts)
+        assert result["predictions"] == sum(c > 0 for c in counts)
+        assert result["empty"] == sum(c == 0 for c in counts)
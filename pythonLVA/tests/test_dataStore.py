@@ -0,0 +1,61 @@
+"""
+Stores hold the same actions as the maps they are saved from, with and without
+compact days, and getTimeStamp (memoized) is the same as time.mktime.
+"""
+
+import datetime
+import os
+import time
+import pytest
+import dataProcessing
+import dataStore
+
+# Runs in a local time zone, with the memoized timestamps of the previous one cleared
+@pytest.fixture
+def timeZone():
+    previous = os.environ.get("TZ")
+    def setTimeZone(name):
+        os.environ["TZ"] = name
+        time.tzset()
+        dataProcessing.getTimeStamp.cache_clear()
+    yield setTimeZone
+    if previous is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = previous
+    time.tzset()
+    dataProcessing.getTimeStamp.cache_clear()
+
+def roundTrip(mapped, path, compactDays):
+    dataStore.saveActions(mapped, path, compactDays)
+    store = dataStore.ActionStore(path)
+    return {customerID: store[customerID] for customerID in store}
+
+@pytest.mark.parametrize("compactDays", [False, True])
+def test_roundTrip(mapped, tmp_path, compactDays):
+    stored = roundTrip(mapped, os.path.join(tmp_path, "store"), compactDays)
+    assert stored == {customerID: list(actions) for customerID,actions in mapped.items()}
+
+def test_compactDaysSkippedMidnight(tmp_path, timeZone):
+    # Clocks went from 00:00 to 01:00 on 2018-11-04 in Sao Paulo, so that day starts
+    # at 01:00
+    timeZone("America/Sao_Paulo")
+    days = [(2018,11,3), (2018,11,4), (2018,11,5)]
+    timestamps = [dataProcessing.getTimeStamp(*d) for d in days]
+    assert datetime.datetime.fromtimestamp(timestamps[1]).hour == 1
+    mapped = {1: [(t, 3, 2000) for t in timestamps], 2: [(timestamps[1], 5, 1999)]}
+    assert roundTrip(mapped, os.path.join(tmp_path, "store"), True) == mapped
+
+def test_compactDaysRejectsOtherTimes(tmp_path):
+    timestamp = dataProcessing.getTimeStamp(2005,1,1)+60*60
+    with pytest.raises(ValueError):
+        dataStore.saveActions({1: [(timestamp, 3, 2000)]}, os.path.join(tmp_path, "store"), True)
+
+def test_getTimeStamp(timeZone):
+    timeZone("America/Sao_Paulo")
+    dates = [datetime.date(1999,11,11)+datetime.timedelta(days=i) for i in range(0, 2300, 7)]
+    for _ in range(2):
+        for d in dates:
+            assert dataProcessing.getTimeStamp(d.year, d.month, d.day) == time.mktime(d.timetuple())
+    info = dataProcessing.getTimeStamp.cache_info()
+    assert info.misses == len(dates) and info.hits == len(dates)
@@ -0,0 +1,22 @@
+"""
+Batched feature extraction (BaseLearner.getFeaturesBatch) gives bit for bit the same
+features as BaseLearner.getFeatures.
+"""
+
+import random
+import numpy as np
+from baseLearner import BaseLearner
+
+def test_getFeaturesBatch(mapped):
+    learner = BaseLearner()
+    # Features need at least 2 actions (for the intervals between them)
+    userActions = [mapped[c] for c in sorted(mapped) if len(mapped[c]) >= 2]
+    expected = np.array([learner.getFeatures(u) for u in userActions])
+    assert np.array_equal(learner.getFeaturesBatch(userActions), expected)
+
+def test_getFeaturesBatchUnsorted(mapped):
+    learner = BaseLearner()
+    rng = random.Random(0)
+    userActions = [rng.sample(mapped[c], len(mapped[c])) for c in sorted(mapped) if len(mapped[c]) >= 2]
+    expected = np.array([learner.getFeatures(u) for u in userActions])
+    assert np.array_equal(learner.getFeaturesBatch(userActions), expected)
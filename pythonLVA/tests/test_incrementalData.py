@@ -0,0 +1,58 @@
+"""
+Incremental updates (incrementalData.updateData) give the same data and splits as a
+full rebuild, after files are changed, added and removed.
+"""
+
+import os
+import shutil
+import pytest
+import dataProcessing
+import incrementalData
+
+# Full rebuild of the data of getData and getSplitData
+def rebuild():
+    mapped = dataProcessing.parseData()
+    train = {}
+    test = {}
+    for customerID,actions in mapped.items():
+        trainActions, testResult, testDuration, valid = dataProcessing.splitFn(actions)
+        if valid:
+            train[customerID] = trainActions
+            test[customerID] = (testResult, testDuration)
+    return mapped, train, test
+
+def checkUpdate(updated):
+    mapped,train,test = updated
+    expectedMapped,expectedTrain,expectedTest = rebuild()
+    # Action lists are kept sorted, instead of in file order
+    assert mapped == {c: sorted(actions) for c,actions in expectedMapped.items()}
+    assert train == expectedTrain
+    assert test == expectedTest
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_updateData(dataDir, tmp_path, monkeypatch, workers):
+    download = os.path.join(tmp_path, "download")
+    shutil.copytree(dataDir, download)
+    monkeypatch.setattr(dataProcessing, "dataDirectory", download)
+    os.makedirs(os.path.join(tmp_path, "work"))
+    monkeypatch.chdir(os.path.join(tmp_path, "work"))
+    trainingSet = os.path.join(download, "training_set")
+    files = sorted(os.listdir(trainingSet))
+
+    # Starts without one file, to add it later
+    added = os.path.join(tmp_path, files[0])
+    shutil.move(os.path.join(trainingSet, files[0]), added)
+    checkUpdate(incrementalData.updateData("state", workers))
+
+    # Changed: the last half of the ratings of a file are dropped
+    changed = os.path.join(trainingSet, files[1])
+    with open(changed) as f:
+        lines = f.readlines()
+    with open(changed, "w") as f:
+        f.writelines(lines[:1+len(lines)//2])
+    shutil.move(added, os.path.join(trainingSet, files[0]))
+    os.remove(os.path.join(trainingSet, files[2]))
+    checkUpdate(incrementalData.updateData("state", workers))
+
+    # Nothing changed
+    checkUpdate(incrementalData.updateData("state", workers))
@@ -0,0 +1,13 @@
+"""
+Learners can be picked with every name the command lines accept: registered names and
+module names.
+"""
+
+import learners
+
+def test_names():
+    for name in learners.names():
+        assert learners.registry[learners.registeredName(name)] in learners.registry.values()
+    assert set(learners.registry) <= set(learners.names())
+    assert set(learners.registry.values()) <= set(learners.names())
+    assert learners.registeredName("simpleLearner") == "simple"
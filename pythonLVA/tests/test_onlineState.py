@@ -0,0 +1,74 @@
+"""
+The online state (onlineState) gives the same features and summaries as the actions
+its events are, and rejects events that come out of time order.
+"""
+
+import numpy as np
+import pytest
+from baseLearner import BaseLearner
+from onlineState import CustomerState, OnlineState, useOnlineState
+from simpleLearner import SimpleLearner
+
+# State from the events of every customer, interleaved in time order like a stream
+def streamed(mapped):
+    state = OnlineState()
+    events = sorted((action, customerID) for customerID,actions in mapped.items() for action in actions)
+    for action,customerID in events:
+        state.update(customerID, action)
+    return state
+
+def test_features(mapped):
+    state = streamed(mapped)
+    customerIDs = [c for c in sorted(mapped) if len(mapped[c]) >= 2]
+    userActions = [mapped[c] for c in customerIDs]
+    rows,found = state.lookup(customerIDs, userActions)
+    assert found.all()
+    expected = np.array([BaseLearner().getFeatures(u) for u in userActions])
+    # Running means and variances round differently from getFeatures. The rounding
+    # errors of variances are relative to their squared means (the variance of equal
+    # timestamps comes out as 1e-13 instead of 0, for instance).
+    scale = np.abs(expected)
+    scale[:,3:6] = np.maximum(scale[:,3:6], expected[:,0:3]**2)
+    scale[:,7] = np.maximum(scale[:,7], expected[:,6]**2)
+    assert (np.abs(rows-expected) <= 1e-12*scale).all()
+
+def test_updateAll(mapped):
+    state = OnlineState()
+    state.updateAll(mapped)
+    customerIDs = sorted(mapped)
+    assert np.array_equal(state.lookup(customerIDs)[0], streamed(mapped).lookup(customerIDs)[0])
+
+def test_lookupMismatch(mapped):
+    state = streamed(mapped)
+    customerID = next(c for c in sorted(mapped) if len(mapped[c]) >= 3)
+    rows,found = state.lookup([customerID, -1], [sorted(mapped[customerID])[:-1], []])
+    assert not found.any()
+    assert state.summary(customerID, sorted(mapped[customerID])[:-1]) is None
+
+def test_simpleLearner(mapped):
+    users = [(c, mapped[c]) for c in sorted(mapped)]
+    periods = [30*24*60*60.]*len(users)
+    expected = SimpleLearner().predictBatch(users, periods)
+    useOnlineState(streamed(mapped))
+    try:
+        learner = SimpleLearner()
+        assert np.allclose(learner.predictBatch(users, periods), expected, rtol=1e-12, atol=0)
+        # Customers with state can be predicted without their actions
+        assert np.allclose(learner.predictBatch([(c, []) for c,_ in users], periods), expected, rtol=1e-12, atol=0)
+    finally:
+        useOnlineState(None)
+
+def test_outOfOrder():
+    state = CustomerState()
+    state.add((100., 3, 2000))
+    # Equal timestamps are fine
+    state.add((100., 4, 2001))
+    with pytest.raises(ValueError):
+        state.add((99., 5, 1999))
+    # The rejected event is not added
+    assert state.count == 2 and state.minimums[1:] == [3., 2000.] and state.maximums == [100., 4., 2001.]
+    online = OnlineState()
+    online.update(1, (100., 3, 2000))
+    with pytest.raises(ValueError):
+        online.update(1, (50., 3, 2000))
+    assert online.summary(1) == (1, 100., 100.)
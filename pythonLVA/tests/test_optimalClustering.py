@@ -0,0 +1,55 @@
+"""
+Exact 1-D clustering (optimalClustering) finds partitions with the smallest sum of
+squared distances, the same as trying every partition.
+"""
+
+import itertools
+import numpy as np
+import dataProcessing
+from optimalClustering import optimalPartition, OptimalClustering
+
+def sumSquares(x, bounds):
+    return sum(((x[a:b]-x[a:b].mean())**2).sum() for a,b in zip(bounds[:-1], bounds[1:]))
+
+# Smallest sum of squared distances of the sorted values x in k clusters
+def bruteForce(x, k):
+    n = len(x)
+    return min(sumSquares(x, [0]+list(c)+[n]) for c in itertools.combinations(range(1, n), k-1))
+
+def checkPartition(values, k):
+    x = np.sort(values)
+    bounds = optimalPartition(values, k)
+    k = min(k, len(np.unique(x)))
+    assert len(bounds) == k+1 and bounds[0] == 0 and bounds[-1] == len(x)
+    assert all(a < b for a,b in zip(bounds[:-1], bounds[1:]))
+    best = bruteForce(x, k)
+    assert abs(sumSquares(x, bounds)-best) <= 1e-9*max(best, 1e-300)
+
+def test_optimalPartitionRandom():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        n = int(rng.integers(1, 12))
+        # Rounded, so that there are ties
+        values = np.round(rng.exponential(1, n), 1)
+        checkPartition(values, int(rng.integers(1, 5)))
+
+def test_optimalPartitionRates(mapped):
+    # Rates of the customers, like in PartitionHMMLearner.learn
+    rates = []
+    for actions in mapped.values():
+        _, testResult, testDuration, valid = dataProcessing.splitFn(actions)
+        if valid:
+            rates.append(testResult/testDuration)
+    for start in range(0, min(len(rates), 100), 10):
+        for k in range(1, 5):
+            checkPartition(np.array(rates[start:start+10]), k)
+
+def test_predictNearestCenter():
+    rng = np.random.default_rng(1)
+    values = rng.lognormal(-10, 1.5, 1000)
+    clustering = OptimalClustering(4).fit(values[:,None])
+    labels = clustering.predict(values[:,None])
+    nearest = np.argmin(np.abs(values[:,None]-clustering.centers[None,:]), axis=1)
+    assert np.array_equal(labels, nearest)
+    for i,center in enumerate(clustering.centers):
+        assert np.isclose(values[labels == i].mean(), center)
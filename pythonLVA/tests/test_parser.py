@@ -0,0 +1,30 @@
+"""
+The whole file parser (parserNF.parseFileArrays) and the bulk map (mapFiles with
+bulk) give the same results as parsing one line at a time with parserNF.parseFile.
+"""
+
+import datetime
+import numpy as np
+import dataProcessing
+import parserNF
+
+def test_parseFileArrays(dataFiles, movieInfo):
+    epoch = datetime.date(1970,1,1).toordinal()
+    for path in dataFiles:
+        with open(path) as dataFile:
+            points = list(parserNF.parseFile(dataFile, movieInfo))
+        with open(path) as dataFile:
+            movieID,customerIDs,ratings,dayNumbers = parserNF.parseFileArrays(dataFile)
+        with open(path) as dataFile:
+            assert movieID == int(dataFile.readline()[:-2])
+        customerID,year,month,day,rating,_ = zip(*points)
+        assert customerIDs.tolist() == list(customerID)
+        assert ratings.tolist() == list(rating)
+        assert dayNumbers.tolist() == [datetime.date(y,m,d).toordinal()-epoch for y,m,d in zip(year, month, day)]
+
+def test_mapFilesBulk(dataFiles, movieInfo, mapped):
+    bulk = dataProcessing.mapFiles(dataFiles, movieInfo, bulk=True)
+    assert bulk == mapped
+    # Same types too, so that pickles and features are the same
+    for customerID,actions in bulk.items():
+        assert [tuple(map(type, a)) for a in actions] == [tuple(map(type, a)) for a in mapped[customerID]]
@@ -0,0 +1,75 @@
+"""
+Saved learners predict the same as the learners they were saved from, and saved
+artifacts are only reused for the same learner configuration and train data.
+"""
+
+import os
+import random
+import numpy as np
+import dataProcessing
+import decisionReg
+import persistence
+import simpleLearner
+from testMethod import getLearner
+
+# Learner that counts how many times it learns (pickled, so not a local class)
+class CountingLearner(simpleLearner.SimpleLearner):
+    learned = []
+
+    def learn(self, data):
+        self.learned.append(len(data))
+
+def splitData(mapped):
+    train = {}
+    test = {}
+    for customerID,actions in mapped.items():
+        trainActions, testResult, testDuration, valid = dataProcessing.splitFn(actions)
+        if valid:
+            train[customerID] = trainActions
+            test[customerID] = (testResult, testDuration)
+    return train, test
+
+def test_saveLoad(mapped, tmp_path, monkeypatch):
+    # decisionReg writes its tree out to the working directory
+    monkeypatch.chdir(tmp_path)
+    train,test = splitData(mapped)
+    data = [(c, train[c], test[c]) for c in sorted(train)]
+    users = [(c, train[c]) for c in sorted(train)]
+    periods = [test[c][1] for c in sorted(train)]
+    for Learner in [simpleLearner.Learner(), decisionReg.Learner()]:
+        learner = Learner()
+        learner.learn(data)
+        path = os.path.join(tmp_path, learner.name)
+        learner.save(path)
+        loaded = type(learner).load(path)
+        assert type(loaded) is type(learner)
+        assert np.array_equal(loaded.predictBatch(users, periods), learner.predictBatch(users, periods))
+
+def test_artifactKey():
+    class Configurable(simpleLearner.SimpleLearner):
+        def __init__(self, mode="a", workers=1):
+            self.mode = mode
+            self.workers = workers
+            self.name = "Configurable"
+    key = lambda learner, version="v": persistence.artifactKey(learner, [3,1,2], version)
+    assert key(Configurable()) == key(Configurable(workers=4))
+    assert key(Configurable()) != key(Configurable(mode="b"))
+    assert key(Configurable()) != key(Configurable(), "w")
+    assert key(Configurable()) == persistence.artifactKey(Configurable(), [1,2,3], "v")
+
+def test_artifactReuse(mapped, tmp_path):
+    train,test = splitData(mapped)
+    trainPath = os.path.join(tmp_path, "pickleTrainFile")
+    with open(trainPath, "w") as f:
+        f.write("first version")
+    learned = CountingLearner.learned = []
+    artifacts = os.path.join(tmp_path, "artifacts")
+    get = lambda: getLearner(train, test, 20, CountingLearner, random.Random(0), artifacts, trainPath)
+    get()
+    get()
+    assert len(learned) == 1
+    # A new version of the train data
+    with open(trainPath, "w") as f:
+        f.write("second version of the data")
+    get()
+    assert len(learned) == 2
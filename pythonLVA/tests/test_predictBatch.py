@@ -0,0 +1,34 @@
+"""
+Batched predictions (predictBatch) are the same as calling predict on every user.
+"""
+
+import random
+import numpy as np
+import pytest
+import dataProcessing
+import decisionReg
+import simpleLearner
+
+@pytest.fixture(scope="module")
+def data(mapped):
+    train = {}
+    test = {}
+    for customerID,actions in mapped.items():
+        trainActions, testResult, testDuration, valid = dataProcessing.splitFn(actions)
+        if valid:
+            train[customerID] = trainActions
+            test[customerID] = (testResult, testDuration)
+    return [(c, train[c], test[c]) for c in sorted(train)]
+
+@pytest.mark.parametrize("module", [simpleLearner, decisionReg])
+def test_predictBatch(module, data, tmp_path, monkeypatch):
+    # decisionReg writes its tree out to the working directory
+    monkeypatch.chdir(tmp_path)
+    learner = module.Learner()()
+    learner.learn(data)
+    # Actions in any order, and periods that differ between users
+    rng = random.Random(0)
+    users = [(c, rng.sample(actions, len(actions))) for c,actions,_ in data]
+    periods = [duration*rng.uniform(0.5, 2) for _,_,(_,duration) in data]
+    expected = np.array([learner.predict(u, p) for u,p in zip(users, periods)])
+    assert np.array_equal(learner.predictBatch(users, periods), expected)
@@ -0,0 +1,170 @@
+"""
+The prediction server, on localhost: batching, bad requests, clients that disconnect
+or cancel, shutdown with idle connections, and rating events.
+"""
+
+import asyncio
+import json
+import logging
+import numpy as np
+import metrics
+from onlineState import OnlineState, useOnlineState
+from predictionServer import PredictionServer
+from simpleLearner import SimpleLearner
+
+oneDay = 24*60*60
+
+def run(test, learner=None, maxDelay=0.05, state=None):
+    async def main():
+        server = PredictionServer(learner or SimpleLearner(), maxBatch=64, maxDelay=maxDelay, state=state)
+        httpServer = await server.start("127.0.0.1", 0)
+        port = httpServer.sockets[0].getsockname()[1]
+        try:
+            return await test(server, port)
+        finally:
+            httpServer.close()
+            await server.stop()
+            await httpServer.wait_closed()
+            if state is not None:
+                useOnlineState(None)
+    return asyncio.run(main())
+
+# Sends one request on a new connection. Returns (status, answer).
+async def post(port, body, path="/predict"):
+    reader,writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+    writer.write(b"POST %s HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (path.encode(), len(payload)) + payload)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        header = await reader.readline()
+        if header in (b"\r\n", b""):
+            break
+        name,_,value = header.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    answer = json.loads(await reader.readexactly(length))
+    writer.close()
+    return status, answer
+
+def request(actions, period):
+    return {"actions": actions, "period": period}
+
+actions = [[1e9, 3, 2000], [1e9+5*oneDay, 4, 1999], [1e9+9*oneDay, 2, 2001]]
+
+def test_batching():
+    async def test(server, port):
+        bodies = [request(actions[:2+i%2], (i+2)*oneDay) for i in range(50)]
+        answers = await asyncio.gather(*[post(port, b) for b in bodies])
+        return bodies, answers, server.batches
+    bodies,answers,batches = run(test)
+    assert [status for status,_ in answers] == [200]*50
+    assert batches < 50
+    learner = SimpleLearner()
+    expected = [learner.predict((-1, [tuple(a) for a in b["actions"]]), b["period"]) for b in bodies]
+    assert np.allclose([answer["prediction"] for _,answer in answers], expected)
+
+def test_badRequests():
+    bad = [
+        request([], oneDay),
+        request([["a", 2, 3], ["b", 3, 4]], oneDay),
+        request([[1e9, 3]], oneDay),
+        request(actions, float("inf")),
+        request(actions, "soon"),
+        {"period": oneDay},
+    ]
+    async def test(server, port):
+        return await asyncio.gather(*[post(port, b) for b in bad+[request(actions, oneDay)]])
+    answers = run(test)
+    assert [status for status,_ in answers] == [400]*len(bad)+[200]
+    assert run(lambda server,port: post(port, b"{not json"))[0] == 400
+
+def test_oneAction():
+    async def test(server, port):
+        return await post(port, request(actions[:1], 5.))
+    status,answer = run(test)
+    assert status == 200
+    assert np.isclose(answer["prediction"], SimpleLearner().predict((-1, [tuple(actions[0])]), 5.))
+
+def test_minActions():
+    class TwoActionLearner(SimpleLearner):
+        minActions = 2
+    async def test(server, port):
+        return await asyncio.gather(post(port, request(actions[:1], oneDay)), post(port, request(actions[:2], oneDay)))
+    answers = run(test, TwoActionLearner())
+    assert [status for status,_ in answers] == [400, 200]
+
+def test_failingRequestOnly():
+    class FailingLearner(SimpleLearner):
+        def predict(self, user, period):
+            if period == 13.:
+                raise ValueError("unlucky")
+            return SimpleLearner.predict(self, user, period)
+        def predictBatch(self, users, periods):
+            return np.array([self.predict(u, p) for u,p in zip(users, periods)])
+    async def test(server, port):
+        return await asyncio.gather(*[post(port, request(actions, p)) for p in [oneDay, 13., 2*oneDay]])
+    answers = run(test, FailingLearner())
+    assert [status for status,_ in answers] == [200, 500, 200]
+
+def test_disconnect():
+    async def test(server, port):
+        # Leaves in the middle of a request, and right after sending one
+        reader,writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"POST /predict HTTP/1.1\r\nContent-Length: 100\r\n\r\n{")
+        writer.close()
+        reader,writer = await asyncio.open_connection("127.0.0.1", port)
+        payload = json.dumps(request(actions, oneDay)).encode()
+        writer.write(b"POST /predict HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(payload) + payload)
+        writer.close()
+        await asyncio.sleep(0.1)
+        return await post(port, request(actions, oneDay))
+    assert run(test)[0] == 200
+
+def test_cancelledRequest():
+    async def test(server, port):
+        # Cancelled while waiting in the queue: the batcher must keep going
+        task = asyncio.ensure_future(server.predict((-1, [tuple(a) for a in actions]), oneDay))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.sleep(0.1)
+        return await asyncio.wait_for(post(port, request(actions, oneDay)), 5)
+    assert run(test)[0] == 200
+
+def test_stopWithIdleConnections(caplog):
+    async def test(server, port):
+        # Keep alive connections, idle when the server stops
+        connections = [await asyncio.open_connection("127.0.0.1", port) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        return connections
+    with caplog.at_level(logging.ERROR, logger="asyncio"):
+        run(test)
+    assert not caplog.records
+
+def test_requestLatencies():
+    metrics.reset()
+    metrics.enable()
+    try:
+        async def test(server, port):
+            return await asyncio.gather(*[post(port, request(actions, oneDay)) for _ in range(20)])
+        run(test)
+    finally:
+        metrics.disable()
+    # One latency per request, not per batch
+    assert metrics.histograms["predict:SimpleLearner"]["count"] == 20
+    metrics.reset()
+
+def test_events():
+    async def test(server, port):
+        answers = []
+        for action in actions+[actions[0]]:
+            answers.append(await post(port, {"customerID": 7, "action": action}, "/event"))
+        answers.append(await post(port, {"customerID": 7, "period": oneDay}))
+        return answers
+    answers = run(test, state=OnlineState())
+    # The event out of time order is rejected, and not added
+    assert [status for status,_ in answers] == [200, 200, 200, 400, 200]
+    assert [answer["count"] for _,answer in answers[:3]] == [1, 2, 3]
+    expected = SimpleLearner().predict((-1, [tuple(a) for a in actions]), oneDay)
+    assert np.isclose(answers[-1][1]["prediction"], expected)
@@ -0,0 +1,29 @@
+"""
+Split views over a sorted store (splitViews.SplitView) hold the same splits as
+dataProcessing.splitFn.
+"""
+
+import os
+import pytest
+import dataProcessing
+import dataStore
+from splitViews import SplitView
+
+@pytest.mark.parametrize("compactDays", [False, True])
+@pytest.mark.parametrize("fracTrain", [0.5, 0.7])
+def test_splitView(mapped, tmp_path, compactDays, fracTrain):
+    dataStore.saveActions(mapped, os.path.join(tmp_path, "store"), compactDays)
+    dataStore.sortStore(dataStore.ActionStore(os.path.join(tmp_path, "store")), os.path.join(tmp_path, "sorted"))
+    split = SplitView(dataStore.ActionStore(os.path.join(tmp_path, "sorted")), fracTrain)
+
+    train = {}
+    test = {}
+    for customerID,actions in mapped.items():
+        trainActions, testResult, testDuration, valid = dataProcessing.splitFn(actions, fracTrain)
+        if valid:
+            train[customerID] = trainActions
+            test[customerID] = (testResult, testDuration)
+    assert sorted(split.train) == sorted(train)
+    for customerID in train:
+        assert split.train[customerID] == train[customerID]
+        assert split.test[customerID] == test[customerID]